@@ -3,156 +3,590 @@ Main application module for Telegram Channel Saver.
 This is the entry point for the application.
 """
 import os
+import sys
 import asyncio
 import logging
-from dotenv import load_dotenv
-from datetime import datetime
-from telethon import TelegramClient
+from datetime import datetime, timezone
 
-from src.config import logger
-from src.database import load_database, save_database, get_db_path
-from src.client import check_authorized, login, restore_session, save_session, get_session_path
+from src.config import logger, SESSION_CHECK_CONCURRENCY, SESSION_CHECK_TIMEOUT, LAST_USED_FLUSH_INTERVAL
+from src.database import (
+    load_database, load_active_phone, save_sessions, activate_session, update_sessions_last_used, delete_sessions,
+    clear_login, get_db_path
+)
+from src.client import (
+    connected, connect_authorized, login, restore_session, save_session, build_client, get_session_file, has_auth_key
+)
 from src.channels import list_channels, display_channels, select_active_channel, show_active_channel
 from src.users import save_channel_users, show_channel_users_stats, list_saved_users
-from src.messages import save_channel_messages, search_messages, browse_messages
-from src.media import download_video_messages, list_downloaded_videos
-from src.export import export_menu
-from src.search_replace import search_replace_messages, restore_edited_messages, list_edited_messages
+
+def _read_api_credentials():
+    """
+    Read and validate API credentials from the environment once
+
+    Returns:
+        tuple: (api_id, api_hash), with None for a missing or invalid value
+    """
+    raw_id = os.environ.get('API_ID', '').strip()
+    api_id = int(raw_id) if raw_id.isdecimal() else None
+    api_hash = os.environ.get('API_HASH', '').strip()
+    return api_id or None, api_hash or None
+
+API_ID, API_HASH = _read_api_credentials()
+
+MENU_TEXT = "\n".join([
+    "\nOptions:",
+    "1. Show account info",
+    "2. List channels/groups",
+    "3. Select active channel",
+    "4. Show active channel info",
+    "5. Save channel users",
+    "6. Show users statistics",
+    "7. List saved sessions",
+    "8. Switch session",
+    "9. Cleanup invalid sessions",
+    "10. Save channel messages",
+    "11. List saved users",
+    "12. Search messages",
+    "13. Browse message index",
+    "14. Search and replace in messages",
+    "15. Restore edited messages",
+    "16. List edited messages",
+    "17. Download videos",
+    "18. List downloaded videos",
+    "19. Export messages",
+    "20. Logout",
+    "21. Exit",
+]) + "\n"
 
 class ChannelSaver:
     """Main application class for Telegram Channel Saver"""
     
     def __init__(self):
         """Initialize the application"""
-        # Load environment variables from .env file
-        load_dotenv()
-        
-        # Database setup
+        # Database setup; loaded in start() while the session reconnects
         self.db_path = get_db_path()
-        self.db = load_database(self.db_path)
+        self.db = None
         
         # Telegram client setup
-        try:
-            self.api_id = int(os.getenv('API_ID'))
-            if not self.api_id:
-                raise ValueError("API_ID not found in environment variables")
-                
-            self.api_hash = os.getenv('API_HASH')
-            if not self.api_hash:
-                raise ValueError("API_HASH not found in environment variables")
-                
-        except (TypeError, ValueError) as e:
-            logger.error(f"Error loading API credentials: {e}")
+        if API_ID is None or API_HASH is None:
+            missing = 'API_ID' if API_ID is None else 'API_HASH'
+            logger.error(f"Error loading API credentials: {missing} not found in environment variables")
             print("\nError: Please make sure API_ID and API_HASH are properly set in .env file")
-            raise
+            raise ValueError(f"{missing} not found in environment variables")
+        self.api_id = API_ID
+        self.api_hash = API_HASH
             
         self.client = None
         self.phone = None
+        self._last_used_dirty = {}
+        self._handlers = self._build_menu_handlers()
+
+    def _flush_last_used_now(self):
+        """Write pending session last_used times to the database"""
+        if not self._last_used_dirty:
+            return
+        pending, self._last_used_dirty = self._last_used_dirty, {}
+        update_sessions_last_used(self.db_path, pending)
+
+    async def _flush_last_used(self):
+        """Periodically write pending session last_used times"""
+        while True:
+            await asyncio.sleep(LAST_USED_FLUSH_INTERVAL)
+            self._flush_last_used_now()
+
+    async def _ainput(self, prompt):
+        """
+        Read a line from stdin without blocking the event loop
+
+        Telethon keeps pinging and receiving in the background; a bare
+        input() would stall it until the user answers.
+
+        Args:
+            prompt: Prompt to display
+
+        Returns:
+            str: Line entered by the user
+        """
+        return await asyncio.to_thread(input, prompt)
+
+    async def _check_session(self, phone):
+        """
+        Check whether a saved session is still authorized
+
+        Only a missing auth key or a definite "not authorized" answer makes
+        a session invalid; timeouts and errors leave its state unknown.
+
+        Args:
+            phone: Phone number of the session
+
+        Returns:
+            str: 'valid', 'invalid' or 'unknown'
+        """
+        try:
+            if not has_auth_key(phone):
+                return 'invalid'
+        except Exception:
+            return 'unknown'
+        
+        client = build_client(phone, self.api_id, self.api_hash)
+        
+        try:
+            async with connected(client, timeout=SESSION_CHECK_TIMEOUT):
+                authorized = await asyncio.wait_for(
+                    client.is_user_authorized(), timeout=SESSION_CHECK_TIMEOUT
+                )
+            return 'valid' if authorized else 'invalid'
+        except Exception:
+            return 'unknown'
 
     async def cleanup_sessions(self):
         """Remove invalid sessions"""
-        if not self.db['sessions']:
+        sessions = self.db['sessions']
+        if not sessions:
             print("\nNo sessions to clean up!")
             return
             
         print("\nChecking sessions validity...")
-        invalid = []
+        semaphore = asyncio.Semaphore(SESSION_CHECK_CONCURRENCY)
+
+        async def check_guarded(phone):
+            async with semaphore:
+                return await self._check_session(phone)
+
+        # Skip active session
+        phones = [phone for phone, session in sessions.items() if not session['active']]
+        results = await asyncio.gather(
+            *(check_guarded(phone) for phone in phones),
+            return_exceptions=True
+        )
+        invalid = [phone for phone, result in zip(phones, results) if result == 'invalid']
+        # Failed checks may be a slow network, so those sessions are never removed
+        unknown = [phone for phone, result in zip(phones, results) if result not in ('valid', 'invalid')]
         
-        for phone, session in self.db['sessions'].items():
-            # Skip active session
-            if session['active']:
-                continue
-                
-            # Try to connect with session
-            client = TelegramClient(
-                get_session_path(phone),
-                self.api_id,
-                self.api_hash
-            )
-            
-            try:
-                await client.connect()
-                if not await client.is_user_authorized():
-                    invalid.append(phone)
-            except Exception:
-                invalid.append(phone)
-            finally:
-                await client.disconnect()
+        if unknown:
+            print(f"\nCould not check {len(unknown)} sessions (timeout or error), keeping them:")
+            for phone in unknown:
+                print(f"  {phone}")
         
         if invalid:
             print(f"\nFound {len(invalid)} invalid sessions")
-            if input("Remove them? (y/N): ").lower() == 'y':
+            if (await self._ainput("Remove them? (y/N): ")).lower() == 'y':
                 for phone in invalid:
                     # Remove session file
                     try:
-                        os.remove(get_session_path(phone))
+                        os.remove(get_session_file(phone))
                     except OSError:
                         pass
                     # Remove from database
-                    del self.db['sessions'][phone]
-                save_database(self.db_path, self.db)
+                    del sessions[phone]
+                delete_sessions(self.db_path, invalid)
                 print("\nInvalid sessions removed!")
-        else:
+        elif not unknown:
             print("\nAll sessions are valid!")
 
     async def list_sessions(self):
         """Display all saved sessions"""
-        if not self.db['sessions']:
+        sessions = self.db['sessions']
+        if not sessions:
             print("\nNo saved sessions found!")
             return
             
-        print("\nSaved Sessions:")
-        print("--------------")
-        for phone, session in self.db['sessions'].items():
+        lines = ["\nSaved Sessions:", "--------------"]
+        for phone, session in sessions.items():
             status = "ACTIVE" if session['active'] else "inactive"
-            print(f"\nPhone: {phone} [{status}]")
-            print(f"Username: @{session['username']}")
-            print(f"Created: {session['created_at']}")
-            print(f"Last used: {session['last_used']}")
+            lines.append(
+                f"\nPhone: {phone} [{status}]\n"
+                f"Username: @{session['username']}\n"
+                f"Created: {session['created_at']}\n"
+                f"Last used: {session['last_used']}"
+            )
+        sys.stdout.write("\n".join(lines) + "\n")
 
     async def switch_session(self):
         """Switch to a different saved session"""
-        if not self.db['sessions']:
+        sessions = self.db['sessions']
+        if not sessions:
             print("\nNo saved sessions found!")
             return False
             
         await self.list_sessions()
         
         while True:
-            phone = input("\nEnter phone number to switch to (or 0 to cancel): ")
+            phone = await self._ainput("\nEnter phone number to switch to (or 0 to cancel): ")
             if phone == '0':
                 return False
                 
-            if phone in self.db['sessions']:
-                # Disconnect current client if exists
-                if self.client:
-                    await self.client.disconnect()
-                
-                # Update active status
-                for p, s in self.db['sessions'].items():
-                    s['active'] = (p == phone)
+            if phone in sessions:
+                # Keep the connected client when the session is already active
+                if phone == self.phone and self.client and self.client.is_connected():
+                    print(f"\nAlready using session: {phone}")
+                    return True
                 
-                # Create new client with selected session
-                self.phone = phone
-                self.client = TelegramClient(
-                    get_session_path(phone),
-                    self.api_id,
-                    self.api_hash
-                )
+                # Connect the new session before dropping the current one
+                client = build_client(phone, self.api_id, self.api_hash)
                 
-                await self.client.connect()
-                if await check_authorized(self.client):
-                    # Update last used
-                    self.db['sessions'][phone]['last_used'] = datetime.now()
-                    save_database(self.db_path, self.db)
-                    print(f"\nSwitched to session: {phone}")
-                    return True
-                else:
+                if not await connect_authorized(client):
                     print("\nSession is no longer valid!")
                     return False
+                
+                if self.client:
+                    await self.client.disconnect()
+                self.client = client
+                self.phone = phone
+                
+                # Update active status of the old and new session only
+                previous = self.db.get('active_phone')
+                if previous in sessions:
+                    sessions[previous]['active'] = False
+                sessions[phone]['active'] = True
+                self.db['active_phone'] = phone
+                
+                # Update last used; written by the periodic flush
+                last_used = datetime.now(timezone.utc).isoformat()
+                sessions[phone]['last_used'] = last_used
+                self._last_used_dirty[phone] = last_used
+                activate_session(self.db_path, phone)
+                print(f"\nSwitched to session: {phone}")
+                return True
             else:
                 print("\nInvalid phone number!")
 
+    async def _menu_account_info(self):
+        """Show information about the logged in account"""
+        me = await self.client.get_me()
+        print(f"\nAccount Information:")
+        print(f"Phone: {self.phone}")
+        print(f"Username: @{me.username}")
+        print(f"First Name: {me.first_name}")
+        print(f"Last Name: {me.last_name}")
+        print(f"User ID: {me.id}")
+
+    async def _menu_list_channels(self):
+        """List channels and groups of the account"""
+        channels = await list_channels(self.client)
+        display_channels(channels)
+
+    async def _menu_select_channel(self):
+        """Select the active channel"""
+        await select_active_channel(self.client, self.db, self.db_path)
+
+    async def _menu_show_channel(self):
+        """Show active channel info"""
+        await show_active_channel(self.client, self.db)
+
+    async def _menu_save_users(self):
+        """Save users of the active channel"""
+        await save_channel_users(self.client, self.db, self.db_path)
+
+    async def _menu_users_stats(self):
+        """Show users statistics"""
+        await show_channel_users_stats(self.db)
+
+    @staticmethod
+    def _opt_int(raw, positive=False):
+        """
+        Parse an optional integer answer
+
+        Args:
+            raw: Text entered by the user
+            positive: Reject zero and negative numbers
+
+        Returns:
+            tuple: (ok, value) where value is None for an empty answer
+        """
+        raw = raw.strip()
+        if not raw:
+            return True, None
+        digits = raw[1:] if raw.startswith('-') else raw
+        if not digits.isdecimal():
+            return False, None
+        value = int(raw)
+        if positive and value <= 0:
+            return False, None
+        return True, value
+
+    async def _prompt_filter_word(self):
+        """Ask for an optional keyword to filter downloaded messages"""
+        filter_input = await self._ainput("\nEnter keyword to filter messages (leave blank to save all): ")
+        return filter_input.strip() or None
+
+    async def _prompt_media_preferences(self):
+        """Ask which media types should be downloaded"""
+        photo_choice = (await self._ainput("Download photos? (Y/n): ")).strip().lower()
+        video_choice = (await self._ainput("Download videos? (Y/n): ")).strip().lower()
+        download_photos = photo_choice != 'n'
+        download_videos = video_choice != 'n'
+        return download_photos, download_videos
+
+    async def _download_new_messages(self):
+        """Download new messages only"""
+        from src.messages import save_channel_messages
+        ok, limit = self._opt_int(await self._ainput("\nEnter number of messages to save (or press Enter for all): "))
+        if not ok:
+            print("\nPlease enter a valid number")
+            return
+        filter_word = await self._prompt_filter_word()
+        download_photos, download_videos = await self._prompt_media_preferences()
+        await save_channel_messages(
+            self.client,
+            self.db,
+            self.db_path,
+            limit=limit,
+            force_redownload=False,
+            filter_word=filter_word,
+            download_photos=download_photos,
+            download_videos=download_videos
+        )
+
+    async def _download_all_messages(self):
+        """Force redownload of all messages"""
+        from src.messages import save_channel_messages
+        confirm = (await self._ainput("\nThis will redownload all messages. Continue? (y/N): ")).lower()
+        if confirm != 'y':
+            return
+        ok, limit = self._opt_int(await self._ainput("\nEnter number of messages to save (or press Enter for all): "))
+        if not ok:
+            print("\nPlease enter a valid number")
+            return
+        filter_word = await self._prompt_filter_word()
+        download_photos, download_videos = await self._prompt_media_preferences()
+        await save_channel_messages(
+            self.client,
+            self.db,
+            self.db_path,
+            limit=limit,
+            force_redownload=True,
+            filter_word=filter_word,
+            download_photos=download_photos,
+            download_videos=download_videos
+        )
+
+    async def _download_recent_messages(self):
+        """Download the most recent messages"""
+        from src.messages import save_channel_messages
+        ok, count = self._opt_int(await self._ainput("\nEnter number of recent messages to download: "), positive=True)
+        if not ok or count is None:
+            print("\nPlease enter a positive number")
+            return
+        filter_word = await self._prompt_filter_word()
+        download_photos, download_videos = await self._prompt_media_preferences()
+        await save_channel_messages(
+            self.client,
+            self.db,
+            self.db_path,
+            recent_count=count,
+            filter_word=filter_word,
+            download_photos=download_photos,
+            download_videos=download_videos
+        )
+
+    async def _download_messages_range(self):
+        """Download messages by ID range"""
+        from src.messages import save_channel_messages
+        prompts = (
+            "\nEnter minimum message ID (or press Enter for first message): ",
+            "Enter maximum message ID (or press Enter for last message): ",
+            "Enter maximum number of messages to download (or press Enter for all): ",
+        )
+        values = []
+        for prompt in prompts:
+            ok, value = self._opt_int(await self._ainput(prompt))
+            if not ok:
+                print("\nPlease enter valid message IDs (numbers only)")
+                return
+            values.append(value)
+        min_id, max_id, limit = values
+        
+        force = (await self._ainput("Force redownload existing messages? (y/N): ")).lower() == 'y'
+
+        filter_word = await self._prompt_filter_word()
+        download_photos, download_videos = await self._prompt_media_preferences()
+        
+        await save_channel_messages(
+            self.client,
+            self.db,
+            self.db_path,
+            min_id=min_id, 
+            max_id=max_id, 
+            limit=limit,
+            force_redownload=force,
+            filter_word=filter_word,
+            download_photos=download_photos,
+            download_videos=download_videos
+        )
+
+    async def _menu_switch_session(self):
+        """Switch to a different saved session"""
+        await self.switch_session()
+
+    async def _menu_save_messages(self):
+        """Show message download options"""
+        print("\nMessage Download Options:")
+        print("1. Download new messages only")
+        print("2. Force redownload all messages")
+        print("3. Download most recent messages")
+        print("4. Download messages by ID range")
+        print("5. Back to main menu")
+
+        handlers = {
+            '1': self._download_new_messages,
+            '2': self._download_all_messages,
+            '3': self._download_recent_messages,
+            '4': self._download_messages_range,
+        }
+        handler = handlers.get(await self._ainput("\nEnter choice (1-5): "))
+        if handler:
+            await handler()
+
+    async def _menu_list_users(self):
+        """List saved users"""
+        await list_saved_users(self.db)
+
+    async def _menu_search_messages(self):
+        """Search saved messages"""
+        from src.messages import search_messages
+        await search_messages(self.db)
+
+    async def _menu_browse_messages(self):
+        """Browse the saved message index"""
+        from src.messages import browse_messages
+        await browse_messages(self.db)
+
+    async def _menu_search_replace(self):
+        """Search and replace in saved messages"""
+        from src.search_replace import search_replace_messages
+        await search_replace_messages(self.db, self.db_path, self.client)
+
+    async def _menu_restore_edited(self):
+        """Restore messages edited by search and replace"""
+        from src.search_replace import restore_edited_messages
+        await restore_edited_messages(self.db, self.db_path, self.client)
+
+    def _menu_list_edited(self):
+        """List messages edited by search and replace"""
+        from src.search_replace import list_edited_messages
+        list_edited_messages(self.db)
+
+    async def _download_videos(self, round_videos_only):
+        """Download videos of the active channel"""
+        from src.media import download_video_messages
+        kind = "video circles" if round_videos_only else "videos"
+        ok, limit = self._opt_int(await self._ainput(f"\nEnter number of {kind} to download (or press Enter for all): "))
+        if not ok:
+            print("\nPlease enter a valid number")
+            return
+        await download_video_messages(
+            self.client, self.db, self.db_path, limit=limit, round_videos_only=round_videos_only
+        )
+
+    async def _menu_download_videos(self):
+        """Show video download options"""
+        print("\nVideo Download Options:")
+        print("1. Download all videos")
+        print("2. Download video circles only (round videos)")
+        print("3. Back to main menu")
+
+        handlers = {
+            '1': lambda: self._download_videos(round_videos_only=False),
+            '2': lambda: self._download_videos(round_videos_only=True),
+        }
+        handler = handlers.get(await self._ainput("\nEnter choice (1-3): "))
+        if handler:
+            await handler()
+
+    def _menu_list_videos(self):
+        """List downloaded videos"""
+        from src.media import list_downloaded_videos
+        list_downloaded_videos(self.db)
+
+    async def _menu_export(self):
+        """Show export options"""
+        from src.export import export_menu
+        await export_menu(self.db, self.client)
+
+    async def _menu_logout(self):
+        """Log out and forget the current session"""
+        await self.client.log_out()
+        print("\nLogged out successfully!")
+        if self.phone in self.db['sessions']:
+            del self.db['sessions'][self.phone]
+        self.db['last_login'] = None
+        self.db['active_channel'] = None
+        self.db['active_phone'] = None
+        clear_login(self.db_path, self.phone)
+        return True
+
+    def _menu_exit(self):
+        """Leave the main menu"""
+        return True
+
+    def _build_menu_handlers(self):
+        """
+        Map main menu choices to their handlers
+
+        Handlers may be sync or async; a truthy result leaves the menu.
+        """
+        return {
+            '1': self._menu_account_info,
+            '2': self._menu_list_channels,
+            '3': self._menu_select_channel,
+            '4': self._menu_show_channel,
+            '5': self._menu_save_users,
+            '6': self._menu_users_stats,
+            '7': self.list_sessions,
+            '8': self._menu_switch_session,
+            '9': self.cleanup_sessions,
+            '10': self._menu_save_messages,
+            '11': self._menu_list_users,
+            '12': self._menu_search_messages,
+            '13': self._menu_browse_messages,
+            '14': self._menu_search_replace,
+            '15': self._menu_restore_edited,
+            '16': self._menu_list_edited,
+            '17': self._menu_download_videos,
+            '18': self._menu_list_videos,
+            '19': self._menu_export,
+            '20': self._menu_logout,
+            '21': self._menu_exit,
+        }
+
+    async def _load_and_restore(self):
+        """
+        Load the database and restore the last session concurrently
+
+        Returns:
+            tuple: (client, me) if the session was restored, (None, None) otherwise
+        """
+        phone = load_active_phone(self.db_path)
+        db_load = asyncio.to_thread(load_database, self.db_path)
+        if phone:
+            db, restored = await asyncio.gather(
+                db_load, restore_session(phone, self.api_id, self.api_hash),
+                return_exceptions=True
+            )
+            if isinstance(restored, BaseException):
+                raise restored
+            client, me = restored
+            if isinstance(db, BaseException):
+                # Don't leave the restored session connected when startup fails
+                if client:
+                    await client.disconnect()
+                raise db
+            self.db = db
+        else:
+            # A freshly migrated database only knows its active phone once loaded
+            self.db = await db_load
+            phone = self.db.get('active_phone')
+            if not phone:
+                return None, None
+            client, me = await restore_session(phone, self.api_id, self.api_hash)
+        
+        if client and phone not in self.db['sessions']:
+            await client.disconnect()
+            return None, None
+        self.phone = phone if client else None
+        return client, me
+
     async def start(self):
         """Main entry point"""
         print("\nWelcome to Channel Saver!")
@@ -164,35 +598,35 @@ class ChannelSaver:
             self.client = None
         
         # Try to restore session first
-        self.client, self.phone = await restore_session(self.db, self.api_id, self.api_hash, self.db_path)
+        self.client, me = await self._load_and_restore()
         if self.client:
+            await save_session(self.db, self.phone, me)
+            save_sessions(self.db_path, self.db)
             print(f"\nRestored session for {self.phone}")
             relogin = False
         else:
             relogin = True
         
+        flush_task = None
         try:
             if relogin:
                 # New login required
-                self.phone = input('Please enter your phone number (international format): ')
+                self.phone = await self._ainput('Please enter your phone number (international format): ')
                 
                 # Create new client
-                self.client = TelegramClient(
-                    get_session_path(self.phone),
-                    self.api_id,
-                    self.api_hash
-                )
+                self.client = build_client(self.phone, self.api_id, self.api_hash)
                 
                 await self.client.connect()
                 me = await login(self.client, self.phone)
                 
                 # Save session after successful login
                 await save_session(self.db, self.phone, me)
-                save_database(self.db_path, self.db)
+                save_sessions(self.db_path, self.db)
                 
                 logger.info(f"Successfully logged in as {me.first_name} (@{me.username})")
                 
             print("\nSuccessfully connected!")
+            flush_task = asyncio.create_task(self._flush_last_used())
             
             while True:
                 # Show active channel in menu if selected
@@ -200,210 +634,24 @@ class ChannelSaver:
                 if active_channel:
                     print(f"\nActive: {active_channel['title']} ({active_channel['type']})")
                 
-                print("\nOptions:")
-                print("1. Show account info")
-                print("2. List channels/groups")
-                print("3. Select active channel")
-                print("4. Show active channel info")
-                print("5. Save channel users")
-                print("6. Show users statistics")
-                print("7. List saved sessions")
-                print("8. Switch session")
-                print("9. Cleanup invalid sessions")
-                print("10. Save channel messages")
-                print("11. List saved users")
-                print("12. Search messages")
-                print("13. Browse message index")
-                print("14. Search and replace in messages")
-                print("15. Restore edited messages")
-                print("16. List edited messages")
-                print("17. Download videos")
-                print("18. List downloaded videos")
-                print("19. Export messages")
-                print("20. Logout")
-                print("21. Exit")
-
-                choice = input("\nEnter your choice (1-21): ")
+                sys.stdout.write(MENU_TEXT)
+
+                choice = await self._ainput("\nEnter your choice (1-21): ")
                 
-                if choice == '1':
-                    me = await self.client.get_me()
-                    print(f"\nAccount Information:")
-                    print(f"Phone: {self.phone}")
-                    print(f"Username: @{me.username}")
-                    print(f"First Name: {me.first_name}")
-                    print(f"Last Name: {me.last_name}")
-                    print(f"User ID: {me.id}")
-                elif choice == '2':
-                    channels = await list_channels(self.client)
-                    display_channels(channels)
-                elif choice == '3':
-                    await select_active_channel(self.client, self.db, self.db_path)
-                elif choice == '4':
-                    await show_active_channel(self.client, self.db)
-                elif choice == '5':
-                    await save_channel_users(self.client, self.db, self.db_path)
-                elif choice == '6':
-                    await show_channel_users_stats(self.db)
-                elif choice == '7':
-                    await self.list_sessions()
-                elif choice == '8':
-                    await self.switch_session()
-                elif choice == '9':
-                    await self.cleanup_sessions()
-                elif choice == '10':
-                    print("\nMessage Download Options:")
-                    print("1. Download new messages only")
-                    print("2. Force redownload all messages")
-                    print("3. Download most recent messages")
-                    print("4. Download messages by ID range")
-                    print("5. Back to main menu")
-                    
-                    def prompt_filter_word():
-                        filter_input = input("\nEnter keyword to filter messages (leave blank to save all): ")
-                        return filter_input.strip() or None
-
-                    def prompt_media_preferences():
-                        photo_choice = input("Download photos? (Y/n): ").strip().lower()
-                        video_choice = input("Download videos? (Y/n): ").strip().lower()
-                        download_photos = photo_choice != 'n'
-                        download_videos = video_choice != 'n'
-                        return download_photos, download_videos
-
-                    dl_choice = input("\nEnter choice (1-5): ")
-                    
-                    if dl_choice == '1':
-                        limit = input("\nEnter number of messages to save (or press Enter for all): ")
-                        limit = int(limit) if limit.strip() else None
-                        filter_word = prompt_filter_word()
-                        download_photos, download_videos = prompt_media_preferences()
-                        await save_channel_messages(
-                            self.client,
-                            self.db,
-                            self.db_path,
-                            limit=limit,
-                            force_redownload=False,
-                            filter_word=filter_word,
-                            download_photos=download_photos,
-                            download_videos=download_videos
-                        )
-                    elif dl_choice == '2':
-                        confirm = input("\nThis will redownload all messages. Continue? (y/N): ").lower()
-                        if confirm == 'y':
-                            limit = input("\nEnter number of messages to save (or press Enter for all): ")
-                            limit = int(limit) if limit.strip() else None
-                            filter_word = prompt_filter_word()
-                            download_photos, download_videos = prompt_media_preferences()
-                            await save_channel_messages(
-                                self.client,
-                                self.db,
-                                self.db_path,
-                                limit=limit,
-                                force_redownload=True,
-                                filter_word=filter_word,
-                                download_photos=download_photos,
-                                download_videos=download_videos
-                            )
-                    elif dl_choice == '3':
-                        count = input("\nEnter number of recent messages to download: ")
-                        try:
-                            count = int(count)
-                            if count <= 0:
-                                print("\nPlease enter a positive number")
-                                continue
-                            filter_word = prompt_filter_word()
-                            download_photos, download_videos = prompt_media_preferences()
-                            await save_channel_messages(
-                                self.client,
-                                self.db,
-                                self.db_path,
-                                recent_count=count,
-                                filter_word=filter_word,
-                                download_photos=download_photos,
-                                download_videos=download_videos
-                            )
-                        except ValueError:
-                            print("\nPlease enter a valid number")
-                    elif dl_choice == '4':
-                        try:
-                            min_id = input("\nEnter minimum message ID (or press Enter for first message): ")
-                            min_id = int(min_id) if min_id.strip() else None
-                            
-                            max_id = input("Enter maximum message ID (or press Enter for last message): ")
-                            max_id = int(max_id) if max_id.strip() else None
-                            
-                            limit = input("Enter maximum number of messages to download (or press Enter for all): ")
-                            limit = int(limit) if limit.strip() else None
-                            
-                            force = input("Force redownload existing messages? (y/N): ").lower() == 'y'
-
-                            filter_word = prompt_filter_word()
-                            download_photos, download_videos = prompt_media_preferences()
-                            
-                            await save_channel_messages(
-                                self.client,
-                                self.db,
-                                self.db_path,
-                                min_id=min_id, 
-                                max_id=max_id, 
-                                limit=limit,
-                                force_redownload=force,
-                                filter_word=filter_word,
-                                download_photos=download_photos,
-                                download_videos=download_videos
-                            )
-                        except ValueError:
-                            print("\nPlease enter valid message IDs (numbers only)")
-                    elif dl_choice == '5':
-                        continue
-                elif choice == '11':
-                    await list_saved_users(self.db)
-                elif choice == '12':
-                    await search_messages(self.db)
-                elif choice == '13':
-                    await browse_messages(self.db)
-                elif choice == '14':
-                    await search_replace_messages(self.db, self.db_path, self.client)
-                elif choice == '15':
-                    await restore_edited_messages(self.db, self.db_path, self.client)
-                elif choice == '16':
-                    list_edited_messages(self.db)
-                elif choice == '17':
-                    print("\nVideo Download Options:")
-                    print("1. Download all videos")
-                    print("2. Download video circles only (round videos)")
-                    print("3. Back to main menu")
-
-                    video_choice = input("\nEnter choice (1-3): ")
-
-                    if video_choice == '1':
-                        limit = input("\nEnter number of videos to download (or press Enter for all): ")
-                        limit = int(limit) if limit.strip() else None
-                        await download_video_messages(self.client, self.db, self.db_path, limit=limit, round_videos_only=False)
-                    elif video_choice == '2':
-                        limit = input("\nEnter number of video circles to download (or press Enter for all): ")
-                        limit = int(limit) if limit.strip() else None
-                        await download_video_messages(self.client, self.db, self.db_path, limit=limit, round_videos_only=True)
-                    elif video_choice == '3':
-                        continue
-                elif choice == '18':
-                    list_downloaded_videos(self.db)
-                elif choice == '19':
-                    await export_menu(self.db, self.client)
-                elif choice == '20':
-                    await self.client.log_out()
-                    print("\nLogged out successfully!")
-                    if self.phone in self.db['sessions']:
-                        del self.db['sessions'][self.phone]
-                    self.db['last_login'] = None
-                    self.db['active_channel'] = None
-                    save_database(self.db_path, self.db)
-                    break
-                elif choice == '21':
-                    break
-                else:
+                handler = self._handlers.get(choice)
+                if handler is None:
                     print("\nInvalid choice!")
+                    continue
+                result = handler()
+                if asyncio.iscoroutine(result):
+                    result = await result
+                if result:
+                    break
 
         finally:
+            if flush_task:
+                flush_task.cancel()
+            self._flush_last_used_now()
             if self.client:
                 await self.client.disconnect()
                 self.client = None
@@ -411,7 +659,13 @@ class ChannelSaver:
 def main():
     """Entry point function"""
     app = ChannelSaver()
-    asyncio.run(app.start())
+    try:
+        # libuv-based event loop when available (not on Windows)
+        import uvloop
+    except ImportError:
+        asyncio.run(app.start())
+    else:
+        uvloop.run(app.start())
 
 if __name__ == '__main__':
     main() 
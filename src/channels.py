@@ -5,7 +5,7 @@ Handles operations related to Telegram channels and groups.
 import logging
 from datetime import datetime
 
-from src.database import save_database
+from src.database import save_setting
 
 logger = logging.getLogger(__name__)
 
@@ -118,7 +118,7 @@ async def select_active_channel(client, db, db_path):
             if selected:
                 # Update active channel in database
                 db['active_channel'] = selected
-                save_database(db_path, db)
+                save_setting(db_path, 'active_channel', selected)
                 print(f"\nSelected channel: {selected['title']}")
                 return True
             else:
@@ -4,16 +4,84 @@ Handles client initialization, authentication, and session management.
 """
 import os
 import logging
-from datetime import datetime
+import functools
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 from telethon import TelegramClient
 from telethon.errors import SessionPasswordNeededError
+from telethon.sessions import SQLiteSession
 import asyncio
 
-from src.config import TEMP_DIR
-from src.database import save_database
+from src.config import TEMP_DIR, CLIENT_CONNECTION_RETRIES, CLIENT_RETRY_DELAY, FLOOD_SLEEP_THRESHOLD
 
 logger = logging.getLogger(__name__)
 
+def build_client(phone, api_id, api_hash):
+    """
+    Build a Telegram client for the saved session of a phone number
+    
+    The app never handles live updates, so the update loop is disabled,
+    and failing connections give up quickly instead of retrying 5 times.
+    
+    Args:
+        phone: Phone number
+        api_id: Telegram API ID
+        api_hash: Telegram API hash
+        
+    Returns:
+        TelegramClient: Client that is not connected yet
+    """
+    return TelegramClient(
+        get_session_path(phone),
+        api_id,
+        api_hash,
+        connection_retries=CLIENT_CONNECTION_RETRIES,
+        retry_delay=CLIENT_RETRY_DELAY,
+        auto_reconnect=True,
+        flood_sleep_threshold=FLOOD_SLEEP_THRESHOLD,
+        receive_updates=False
+    )
+
+@asynccontextmanager
+async def connected(client, timeout=None):
+    """
+    Keep a client connected for the duration of a block
+    
+    Unlike ``async with client``, this never starts an interactive login,
+    and the client is disconnected even if the block fails or is cancelled.
+    
+    Args:
+        client: Telegram client
+        timeout: Optional connect timeout in seconds
+    """
+    try:
+        await asyncio.wait_for(client.connect(), timeout)
+        yield client
+    finally:
+        await client.disconnect()
+
+async def connect_authorized(client):
+    """
+    Connect a client that should stay open and check its authorization
+    
+    The client is disconnected again unless it turns out to be authorized,
+    including when connecting fails or is cancelled.
+    
+    Args:
+        client: Telegram client
+        
+    Returns:
+        bool: True if the client is connected and authorized
+    """
+    authorized = False
+    try:
+        await client.connect()
+        authorized = await check_authorized(client)
+        return authorized
+    finally:
+        if not authorized:
+            await client.disconnect()
+
 async def create_client(api_id, api_hash, session_path):
     """
     Create and initialize a Telegram client
@@ -63,17 +131,19 @@ async def login(client, phone, force=False):
     if not await client.is_user_authorized():
         try:
             await client.send_code_request(phone)
-            code = input('Enter the code you received: ')
+            # Read in a thread so Telethon keeps running while the user types
+            code = await asyncio.to_thread(input, 'Enter the code you received: ')
             await client.sign_in(phone, code)
         except SessionPasswordNeededError:
             # 2FA is enabled
-            password = input('Please enter your 2FA password: ')
+            password = await asyncio.to_thread(input, 'Please enter your 2FA password: ')
             await client.sign_in(password=password)
     
     # Get user info
     me = await client.get_me()
     return me
 
+@functools.lru_cache(maxsize=128)
 def get_session_path(phone):
     """
     Get full path to session file for given phone number
@@ -86,6 +156,39 @@ def get_session_path(phone):
     """
     return os.path.join(TEMP_DIR, f'user_{phone}')
 
+def get_session_file(phone):
+    """
+    Get the on-disk file Telethon uses for the session of a phone number
+    
+    Args:
+        phone: Phone number
+        
+    Returns:
+        str: Path to the .session file
+    """
+    return get_session_path(phone) + '.session'
+
+def has_auth_key(phone):
+    """
+    Check whether a saved session file holds an authorization key
+    
+    Sessions without a key can never be authorized, so they can be
+    rejected without opening a network connection.
+    
+    Args:
+        phone: Phone number
+        
+    Returns:
+        bool: True if the session file exists and has an auth key
+    """
+    if not os.path.exists(get_session_file(phone)):
+        return False
+    session = SQLiteSession(get_session_path(phone))
+    try:
+        return bool(session.auth_key and session.auth_key.key)
+    finally:
+        session.close()
+
 async def save_session(db, phone, me):
     """
     Save current session info to database
@@ -98,11 +201,13 @@ async def save_session(db, phone, me):
     if not phone:
         return
         
+    now = datetime.now(timezone.utc).isoformat()
+    
     # Update sessions info
     db['sessions'][phone] = {
         'session_file': f'user_{phone}',
-        'created_at': db['sessions'].get(phone, {}).get('created_at', str(datetime.now())),
-        'last_used': str(datetime.now()),
+        'created_at': db['sessions'].get(phone, {}).get('created_at', now),
+        'last_used': now,
         'user_id': me.id,
         'username': me.username,
         'active': True
@@ -113,64 +218,39 @@ async def save_session(db, phone, me):
         'phone': phone,
         'user_id': me.id,
         'username': me.username,
-        'date': str(datetime.now())
+        'date': now
     }
     
-    # Deactivate other sessions
-    for p in db['sessions']:
-        if p != phone:
-            db['sessions'][p]['active'] = False
+    # Deactivate the previously active session
+    previous = db.get('active_phone')
+    if previous != phone and previous in db['sessions']:
+        db['sessions'][previous]['active'] = False
+    db['active_phone'] = phone
 
-async def restore_session(db, api_id, api_hash, db_path):
+async def restore_session(phone, api_id, api_hash):
     """
-    Try to restore last active session
+    Try to restore the saved session of a phone number
     
     Args:
-        db: Database
+        phone: Phone number of the last active session
         api_id: Telegram API ID
         api_hash: Telegram API hash
-        db_path: Path to database file
         
     Returns:
-        tuple: (client, phone) tuple if successful, (None, None) otherwise
+        tuple: (client, me) tuple if successful, (None, None) otherwise
     """
-    if not db.get('sessions'):
-        return None, None
-        
-    # Find active session
-    active_session = None
-    active_phone = None
-    
-    for phone, session in db['sessions'].items():
-        if session.get('active'):
-            active_session = session
-            active_phone = phone
-            break
-    
-    if not active_session:
-        return None, None
-        
-    # Try to restore session
+    client = None
     try:
-        phone = active_phone
-        client = TelegramClient(
-            get_session_path(phone),
-            api_id,
-            api_hash
-        )
+        client = build_client(phone, api_id, api_hash)
         
-        await client.connect()
-        if await check_authorized(client):
-            # Update last used time
+        if await connect_authorized(client):
             me = await client.get_me()
-            await save_session(db, phone, me)
-            save_database(db_path, db)
             logger.info(f"Restored session for {phone}")
-            return client, phone
+            return client, me
                 
     except Exception as e:
         logger.error(f"Failed to restore session: {e}")
         if client:
             await client.disconnect()
             
-    return None, None 
\ No newline at end of file
+    return None, None
@@ -13,19 +13,78 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+def load_env(path='.env'):
+    """
+    Load KEY=VALUE lines from a .env file into os.environ
+
+    Variables already set in the environment are kept.
+
+    Args:
+        path: Path to the .env file
+    """
+    try:
+        f = open(path, 'r', encoding='utf-8')
+    except FileNotFoundError:
+        return
+    with f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            key, _, value = line.partition('=')
+            key = key.strip()
+            if key.startswith('export '):
+                key = key[len('export '):].strip()
+            value = value.strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+                value = value[1:-1]
+            os.environ.setdefault(key, value)
+
+# Load environment variables from .env file
+load_env()
+
 # Batch size and timing settings
 MESSAGES_BATCH_SIZE = 100  # Number of messages to process in one batch
 BATCH_DELAY = 2  # Delay between batches in seconds
-SAVE_INTERVAL = 300  # Save database every 5 minutes
 MAX_RETRIES = 3  # Maximum retries for failed message fetches
+PROGRESS_REFRESH_INTERVAL = 0.5  # Minimum seconds between progress display updates
+VERBOSE = os.getenv('TCS_VERBOSE') == '1'  # Print per-batch and per-media details while saving
+
+# Telegram client settings
+CLIENT_CONNECTION_RETRIES = 2  # Connection attempts before giving up
+CLIENT_RETRY_DELAY = 1  # Delay between connection attempts in seconds
+FLOOD_SLEEP_THRESHOLD = 60  # Sleep through flood waits up to this many seconds
+
+# Session validation settings
+SESSION_CHECK_CONCURRENCY = 8  # Maximum sessions checked at the same time
+SESSION_CHECK_TIMEOUT = 5  # Timeout for a single session check in seconds
+LAST_USED_FLUSH_INTERVAL = 10  # Seconds between writes of session last_used times
 
 # Media download settings
 MEDIA_DOWNLOAD_DELAY = 3  # Delay between media downloads in seconds to avoid rate limits
+MEDIA_DOWNLOAD_CONCURRENCY = 4  # Maximum media downloads running at the same time
 MEDIA_DOWNLOAD_TIMEOUT = 120  # Timeout for media downloads in seconds (2 minutes)
 MEDIA_DOWNLOAD_RETRY = 3  # Maximum number of retries for failed media downloads
 MEDIA_RETRY_DELAY_BASE = 5  # Base delay for retry backoff in seconds
 CHUNK_SIZE = 1024 * 1024  # 1MB chunk size for large downloads
 
+# Search and replace settings
+CHANNEL_EDIT_DELAY = 0.5  # Minimum seconds between message edits sent to Telegram
+CHANNEL_EDIT_CONCURRENCY = 5  # Maximum batch channel edits in flight at the same time
+CHANNEL_FETCH_BATCH_SIZE = 100  # Messages fetched per request before batch channel edits (Telegram maximum)
+
+# Browse settings
+BROWSE_PAGE_SIZE = 10  # Messages per page when browsing saved messages
+
+# Export settings
+USER_LOOKUP_RETRY_TTL = 300  # Seconds before retrying a user that could not be fetched
+USER_LOOKUP_CONCURRENCY = 20  # Maximum user lookups running at the same time
+EXPORT_BATCH_SIZE = 1000  # Formatted messages joined into one write
+EXPORT_WRITE_BUFFER = 1024 * 1024  # 1MB buffer for export files
+EXPORT_PROGRESS_INTERVAL = 0.25  # Minimum seconds between export progress updates
+EXPORT_FILE_MAX_MESSAGES = 50000  # Larger exports are split into part files
+EXPORT_MENU_USERS_SHOWN = 30  # Most active users offered for per-user export
+
 # Directory settings
 TEMP_DIR = 'temp/channel_saver'
 VIDEO_TEMP_DIR = 'temp/videos'  # Directory for storing downloaded videos
@@ -1,72 +1,482 @@
 """
 Database operations for the Telegram Channel Saver.
-Handles loading, saving, and managing the JSON database.
+Handles loading, saving, and managing the SQLite database.
 """
 import os
 import json
+import sqlite3
 import logging
-from datetime import datetime
+import threading
+import functools
+from contextlib import contextmanager
 
 from src.config import TEMP_DIR
 
+try:
+    # Much faster JSON encoding and decoding when available
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# Per-channel collections, stored as one row per item
+COLLECTION_TABLES = ('messages', 'users', 'videos')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    phone TEXT PRIMARY KEY,
+    session_file TEXT,
+    user_id INTEGER,
+    username TEXT,
+    created_at TEXT,
+    last_used TEXT,
+    active INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS kv (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS messages (
+    channel_id TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (channel_id, item_id)
+);
+CREATE TABLE IF NOT EXISTS users (
+    channel_id TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (channel_id, item_id)
+);
+CREATE TABLE IF NOT EXISTS videos (
+    channel_id TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (channel_id, item_id)
+);
+"""
+
+_connections = {}
+
+# One connection per file is shared by the event loop and worker threads;
+# the lock keeps their statements and transactions from interleaving
+_db_lock = threading.RLock()
+
+def connect_db(db_path):
+    """
+    Get the shared SQLite connection for a database file
+
+    The connection is opened once per path and configured for WAL mode,
+    so readers never block the writer and commits only append to the log.
+
+    Args:
+        db_path: Path to the database file
+
+    Returns:
+        sqlite3.Connection: Open connection in autocommit mode
+    """
+    with _db_lock:
+        conn = _connections.get(db_path)
+        if conn is None:
+            conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=5000')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            conn.executescript(SCHEMA)
+            _connections[db_path] = conn
+        return conn
+
+def close_db(db_path):
+    """
+    Close the shared connection for a database file if it is open
+
+    Args:
+        db_path: Path to the database file
+    """
+    with _db_lock:
+        conn = _connections.pop(db_path, None)
+        if conn is not None:
+            conn.close()
+
+@contextmanager
+def transaction(conn):
+    """
+    Run a block of writes inside a single BEGIN IMMEDIATE ... COMMIT
+
+    Holds the connection lock for the whole block, so a save from a worker
+    thread and one from the event loop never share a transaction.
+
+    Args:
+        conn: SQLite connection from connect_db
+    """
+    with _db_lock:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+def _empty_database():
+    """Return the base in-memory database structure"""
+    return {
+        'users': {},
+        'last_login': None,
+        'sessions': {},
+        'active_channel': None,
+        'messages': {},
+        'videos': {},
+        'active_phone': None
+    }
+
+def _encode(value):
+    """Serialize a value for storage in a TEXT column"""
+    if orjson is not None:
+        try:
+            # Datetimes go through default=str like with json
+            return orjson.dumps(
+                value, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            ).decode()
+        except TypeError:
+            # orjson rejects some values json accepts, e.g. integers over 64 bits
+            pass
+    return json.dumps(value, default=str)
+
+def _decode(text):
+    """Deserialize a value stored by _encode"""
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
+
+def _text(value):
+    """Convert an optional value to a string column value"""
+    return None if value is None else str(value)
+
 def load_database(db_path):
     """
-    Load database from JSON file or create new if doesn't exist
-    
+    Load database from SQLite file or create new if doesn't exist
+
+    A legacy database.json next to the new file is imported on first run.
+
     Args:
         db_path: Path to the database file
-        
+
     Returns:
         dict: Loaded database or new database structure
     """
-    if os.path.exists(db_path):
+    if not os.path.exists(db_path):
+        legacy = _load_legacy_database(db_path)
+        if legacy is not None:
+            save_database(db_path, legacy)
+            logger.info(f"Migrated legacy JSON database to {db_path}")
+            return legacy
+        return create_new_database(db_path)
+    try:
+        with _db_lock:
+            return _read_database(connect_db(db_path))
+    except sqlite3.DatabaseError:
+        logger.warning("Corrupted database file, creating new")
+        close_db(db_path)
+        # Move the WAL files too, or they would be replayed onto the new database
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.replace(db_path + suffix, db_path + '.corrupt' + suffix)
+        return create_new_database(db_path)
+
+def load_active_phone(db_path):
+    """
+    Read only the phone of the active session
+
+    Lets the app start restoring the session before the full database,
+    with all messages, is loaded. A missing legacy-only or unreadable
+    database gives None; load_database migrates or recovers it.
+
+    Args:
+        db_path: Path to the database file
+
+    Returns:
+        str: Active phone number, or None if unknown
+    """
+    if not os.path.exists(db_path):
+        return None
+    try:
+        with _db_lock:
+            row = connect_db(db_path).execute("SELECT value FROM kv WHERE key = 'active_phone'").fetchone()
+    except sqlite3.DatabaseError:
+        return None
+    return _decode(row[0]) if row else None
+
+def _load_legacy_database(db_path):
+    """
+    Read the pre-SQLite JSON database if one exists
+
+    Args:
+        db_path: Path to the SQLite database file
+
+    Returns:
+        dict: Legacy database contents, or None if there is none
+    """
+    legacy_path = os.path.join(os.path.dirname(db_path), 'database.json')
+    if not os.path.exists(legacy_path):
+        return None
+    try:
+        with open(legacy_path, 'r') as f:
+            legacy = json.load(f)
+    except json.JSONDecodeError:
+        logger.warning("Corrupted legacy JSON database, ignoring")
+        return None
+    db = _empty_database()
+    db.update(legacy)
+    db['active_phone'] = _find_active_phone(db['sessions'])
+    return db
+
+def _find_active_phone(sessions):
+    """Return the phone of the session flagged active, if any"""
+    return next((phone for phone, session in sessions.items() if session.get('active')), None)
+
+def _read_database(conn):
+    """
+    Read all tables into the in-memory database structure
+
+    Args:
+        conn: SQLite connection
+
+    Returns:
+        dict: Database dictionary
+    """
+    db = _empty_database()
+    for key, value in conn.execute('SELECT key, value FROM kv'):
         try:
-            with open(db_path, 'r') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            logger.warning("Corrupted database file, creating new")
-            return create_new_database(db_path)
-    return create_new_database(db_path)
+            db[key] = _decode(value)
+        except ValueError:
+            logger.warning(f"Skipping unreadable setting {key}")
+
+    rows = conn.execute(
+        'SELECT phone, session_file, created_at, last_used, user_id, username, active FROM sessions'
+    )
+    for phone, session_file, created_at, last_used, user_id, username, active in rows:
+        db['sessions'][phone] = {
+            'session_file': session_file,
+            'created_at': created_at,
+            'last_used': last_used,
+            'user_id': user_id,
+            'username': username,
+            'active': bool(active)
+        }
+
+    for table in COLLECTION_TABLES:
+        collection = db[table]
+        for channel_id, item_id, data in conn.execute(f'SELECT channel_id, item_id, data FROM {table}'):
+            try:
+                item = _decode(data)
+            except ValueError:
+                # One bad row should not make the rest of the database unusable
+                logger.warning(f"Skipping unreadable {table} row {channel_id}/{item_id}")
+                continue
+            collection.setdefault(channel_id, {})[str(item_id)] = item
+
+    # Databases written before active_phone was tracked only have the flags
+    if db['active_phone'] not in db['sessions']:
+        db['active_phone'] = _find_active_phone(db['sessions'])
+    return db
 
 def create_new_database(db_path):
     """
     Create new database structure
-    
+
     Args:
         db_path: Path to save the new database
-        
+
     Returns:
         dict: New empty database structure
     """
-    db = {
-        'users': {},
-        'last_login': None,
-        'sessions': {},
-        'active_channel': None,
-        'messages': {},
-        'videos': {}
-    }
+    db = _empty_database()
     save_database(db_path, db)
     return db
 
 def save_database(db_path, db):
     """
-    Save database to JSON file
-    
+    Save the whole database in a single transaction
+
+    Prefer the targeted helpers below for small updates; this rewrites
+    every row.
+
     Args:
         db_path: Path to save the database
         db: Database dictionary to save
     """
-    with open(db_path, 'w') as f:
-        json.dump(db, f, indent=4, default=str)
+    conn = connect_db(db_path)
+    with transaction(conn):
+        _write_settings(conn, db)
+        _write_sessions(conn, db.get('sessions') or {})
+        for table in COLLECTION_TABLES:
+            _write_collection(conn, table, db.get(table) or {})
+
+def _write_settings(conn, db):
+    """Write top-level scalar keys to the kv table"""
+    skip = {'sessions', *COLLECTION_TABLES}
+    settings = {key: value for key, value in db.items() if key not in skip}
+    conn.execute('DELETE FROM kv')
+    conn.executemany(
+        'INSERT INTO kv (key, value) VALUES (?, ?)',
+        [(key, _encode(value)) for key, value in settings.items()]
+    )
+
+def _write_sessions(conn, sessions):
+    """Replace the sessions table with the in-memory sessions"""
+    conn.execute('DELETE FROM sessions')
+    conn.executemany(
+        'INSERT INTO sessions (phone, session_file, created_at, last_used, user_id, username, active) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+        [
+            (
+                phone,
+                session.get('session_file'),
+                _text(session.get('created_at')),
+                _text(session.get('last_used')),
+                session.get('user_id'),
+                session.get('username'),
+                int(bool(session.get('active')))
+            )
+            for phone, session in sessions.items()
+        ]
+    )
+
+def _write_collection(conn, table, collection):
+    """Upsert every item of a per-channel collection and drop removed rows"""
+    stored = set(conn.execute(f'SELECT channel_id, item_id FROM {table}'))
+    rows = []
+    for channel_id, items in collection.items():
+        for item_id, item in items.items():
+            key = (str(channel_id), int(item_id))
+            stored.discard(key)
+            rows.append((key[0], key[1], _encode(item)))
+    conn.executemany(
+        f'INSERT OR REPLACE INTO {table} (channel_id, item_id, data) VALUES (?, ?, ?)',
+        rows
+    )
+    conn.executemany(f'DELETE FROM {table} WHERE channel_id = ? AND item_id = ?', stored)
+
+def save_channel_items(db_path, table, channel_id, items):
+    """
+    Upsert some items of one channel's collection in a single transaction
+
+    Costs O(len(items)) instead of rewriting the whole database.
+
+    Args:
+        db_path: Path to the database file
+        table: Collection name, one of COLLECTION_TABLES
+        channel_id: Channel ID
+        items: Dict mapping item ID to item
+    """
+    if table not in COLLECTION_TABLES:
+        raise ValueError(f"Unknown collection: {table}")
+    # Encode before taking the write lock so the transaction only covers the inserts
+    channel_id = str(channel_id)
+    rows = [(channel_id, int(item_id), _encode(item)) for item_id, item in items.items()]
+    conn = connect_db(db_path)
+    with transaction(conn):
+        conn.executemany(
+            f'INSERT OR REPLACE INTO {table} (channel_id, item_id, data) VALUES (?, ?, ?)',
+            rows
+        )
+
+def save_setting(db_path, key, value):
+    """
+    Save a single top-level setting such as active_channel
+
+    Args:
+        db_path: Path to the database file
+        key: Setting name
+        value: JSON-serializable value
+    """
+    conn = connect_db(db_path)
+    with transaction(conn):
+        conn.execute('INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)', (key, _encode(value)))
+
+def save_sessions(db_path, db):
+    """
+    Save sessions and last login info without touching other tables
+
+    Args:
+        db_path: Path to the database file
+        db: Database dictionary
+    """
+    conn = connect_db(db_path)
+    with transaction(conn):
+        _write_sessions(conn, db.get('sessions') or {})
+        conn.executemany(
+            'INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)',
+            [(key, _encode(db.get(key))) for key in ('last_login', 'active_phone')]
+        )
+
+def activate_session(db_path, phone):
+    """
+    Mark one session active and all others inactive
+
+    Args:
+        db_path: Path to the database file
+        phone: Phone number of the session to activate
+    """
+    conn = connect_db(db_path)
+    with transaction(conn):
+        conn.execute('UPDATE sessions SET active = (phone = ?) WHERE active OR phone = ?', (phone, phone))
+        conn.execute(
+            'INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)', ('active_phone', _encode(phone))
+        )
+
+def update_sessions_last_used(db_path, last_used):
+    """
+    Write pending last_used timestamps in one transaction
+
+    Args:
+        db_path: Path to the database file
+        last_used: Dict mapping phone number to timestamp string
+    """
+    conn = connect_db(db_path)
+    with transaction(conn):
+        conn.executemany(
+            'UPDATE sessions SET last_used = ? WHERE phone = ?',
+            [(timestamp, phone) for phone, timestamp in last_used.items()]
+        )
+
+def delete_sessions(db_path, phones):
+    """
+    Delete several sessions in one transaction
+
+    Args:
+        db_path: Path to the database file
+        phones: Phone numbers of the sessions to delete
+    """
+    conn = connect_db(db_path)
+    with transaction(conn):
+        conn.executemany('DELETE FROM sessions WHERE phone = ?', [(phone,) for phone in phones])
+
+def clear_login(db_path, phone):
+    """
+    Delete a logged out session along with the login and channel selection
+
+    Args:
+        db_path: Path to the database file
+        phone: Phone number of the logged out session
+    """
+    conn = connect_db(db_path)
+    with transaction(conn):
+        conn.execute('DELETE FROM sessions WHERE phone = ?', (phone,))
+        conn.execute("DELETE FROM kv WHERE key IN ('last_login', 'active_channel', 'active_phone')")
 
+@functools.lru_cache(maxsize=None)
 def get_db_path():
     """
     Get the path to the database file
-    
+
     Returns:
         str: Path to the database file
     """
-    return os.path.join(TEMP_DIR, 'database.json') 
\ No newline at end of file
+    return os.path.join(TEMP_DIR, 'database.db')
@@ -1,64 +1,163 @@
 import os
+import re
+import sys
 import time
+import asyncio
 import logging
-from datetime import datetime
+from collections import Counter
+from operator import itemgetter
+from datetime import datetime, timezone
 
+from src.config import (
+    USER_LOOKUP_RETRY_TTL, USER_LOOKUP_CONCURRENCY, EXPORT_BATCH_SIZE, EXPORT_WRITE_BUFFER,
+    EXPORT_PROGRESS_INTERVAL, EXPORT_FILE_MAX_MESSAGES, EXPORT_MENU_USERS_SHOWN
+)
 from src.database import save_database
 from src.message_export import export_individual_messages
+from src.messages import get_message_index
 
 logger = logging.getLogger(__name__)
 
+# (channel_id, user_id) -> time of the last failed API lookup
+_failed_user_lookups = {}
+
+# channel_id -> ((dict id, message count, user count), statistics)
+_stats_cache = {}
+
+# Characters replaced with '_' in export filenames (\w matches str.isalnum() and '_')
+_UNSAFE_TITLE_CHARS = re.compile(r'[^\w \-]')
+_UNSAFE_USERNAME_CHARS = re.compile(r'[^\w\-]')
+
+def _safe_filename_part(text, unsafe_chars=_UNSAFE_TITLE_CHARS):
+    """
+    Make a channel title or username safe for use in a filename
+
+    Args:
+        text: Title or username
+        unsafe_chars: Compiled pattern of characters to replace with '_'
+
+    Returns:
+        str: Sanitized text with spaces replaced by underscores
+    """
+    return unsafe_chars.sub('_', text).strip().replace(' ', '_')
+
+# Media types counted as videos in channel statistics
+_VIDEO_MEDIA_TYPES = frozenset(('MessageMediaDocument', 'MessageMediaVideo'))
+
+# Sort key for messages whose date cannot be parsed
+_DATE_MAX = datetime.max.replace(tzinfo=timezone.utc)
+
+def _parse_date(date_str):
+    """
+    Parse a stored message date such as 2024-01-01 10:00:00+00:00
+
+    Args:
+        date_str: Date string saved with the message
+
+    Returns:
+        datetime: Timezone-aware datetime
+    """
+    try:
+        return datetime.fromisoformat(date_str)
+    except ValueError:
+        # Offsets without a colon are only accepted by fromisoformat on 3.11+
+        return datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S%z")
+
+def _date_sort_key(msg):
+    """Parsed message date, with unparseable dates sorting last"""
+    try:
+        return _parse_date(msg['date'])
+    except (ValueError, TypeError):
+        return _DATE_MAX
+
+def sort_messages_by_date(messages):
+    """
+    Sort messages chronologically, skipping messages without a date
+
+    Saved dates share one UTC offset, so their strings already sort in
+    chronological order; dates are only parsed when the offsets differ.
+
+    Args:
+        messages: Iterable of message dicts
+
+    Returns:
+        list: Messages sorted by date
+    """
+    dated = [msg for msg in messages if msg.get('date')]
+    if len({msg['date'][19:] for msg in dated}) <= 1:
+        dated.sort(key=itemgetter('date'))
+    else:
+        dated.sort(key=_date_sort_key)
+    return dated
+
 def get_channel_statistics(db, channel_id):
-    """Get statistics for a channel"""
+    """
+    Get statistics for a channel
+    
+    Results are reused while the channel's message and user counts are
+    unchanged, so reopening the export menu does not rescan all messages.
+    """
     channel_id = str(channel_id)
+    msgs = db.get('messages', {}).get(channel_id, {})
+    users_count = len(db.get('users', {}).get(channel_id, {}))
     
-    # Count messages
-    messages_count = 0
-    if 'messages' in db and channel_id in db['messages']:
-        messages_count = len(db['messages'][channel_id])
-    
-    # Count media
-    media_count = 0
-    video_count = 0
-    if 'messages' in db and channel_id in db['messages']:
-        for msg_id, msg in db['messages'][channel_id].items():
-            if msg.get('has_media', False):
-                media_count += 1
-                if msg.get('media_type') in ['MessageMediaDocument', 'MessageMediaVideo']:
-                    video_count += 1
-    
-    # Count users
-    users_count = 0
-    if 'users' in db and channel_id in db['users']:
-        users_count = len(db['users'][channel_id])
-        
-    return {
-        'messages': messages_count,
-        'media': media_count,
-        'videos': video_count,
+    signature = (id(msgs), len(msgs), users_count)
+    cached = _stats_cache.get(channel_id)
+    if cached and cached[0] == signature:
+        return dict(cached[1])
+    
+    # Single scan in a comprehension, video check runs in C via map
+    media_types = [msg.get('media_type') for msg in msgs.values() if msg.get('has_media', False)]
+    
+    stats = {
+        'messages': len(msgs),
+        'media': len(media_types),
+        'videos': sum(map(_VIDEO_MEDIA_TYPES.__contains__, media_types)),
         'users': users_count
     }
+    _stats_cache[channel_id] = (signature, stats)
+    return dict(stats)
+
+def count_messages_per_user(db, channel_id):
+    """
+    Count messages per sender in a channel
+    
+    Returns:
+        Counter: Message count by from_id
+    """
+    channel_msgs = db.get('messages', {}).get(str(channel_id), {})
+    return Counter(msg.get('from_id') for msg in channel_msgs.values() if msg.get('from_id'))
 
-async def list_users_in_channel(db, channel_id, client=None):
-    """List all users who have messages in a channel"""
+async def list_users_in_channel(db, channel_id, client=None, limit=None, counts=None):
+    """
+    List users who have messages in a channel, most active first
+    
+    Args:
+        db: Database dictionary
+        channel_id: Channel ID
+        client: Optional Telegram client for users missing from the database
+        limit: Only list this many of the most active users
+        counts: Precomputed result of count_messages_per_user
+        
+    Returns:
+        list: User dicts with message counts
+    """
     channel_id = str(channel_id)
-    active_users = {}
-    
-    # Build user dictionary with message counts
-    if 'messages' in db and channel_id in db['messages']:
-        for msg_id, msg in db['messages'][channel_id].items():
-            user_id = msg.get('from_id')
-            if user_id:
-                if user_id not in active_users:
-                    active_users[user_id] = 0
-                active_users[user_id] += 1
-    
-    # Get user info
+    
+    # most_common(limit) uses a heap, so only the listed users are sorted
+    if counts is None:
+        counts = count_messages_per_user(db, channel_id)
+    active_users = counts.most_common(limit)
+    
+    # Get user info from database first, or fetch from API if needed
+    user_ids = [user_id for user_id, _ in active_users]
+    if client:
+        user_infos = await get_users_info(client, channel_id, user_ids, db)
+    else:
+        user_infos = [None] * len(user_ids)
+    
     users = []
-    for user_id, msg_count in active_users.items():
-        # Try to get user info from database first, or fetch from API if needed
-        user_info = await get_user_info_for_id(client, channel_id, user_id, db) if client else None
-        
+    for (user_id, msg_count), user_info in zip(active_users, user_infos):
         if user_info:
             users.append({
                 'id': user_id,
@@ -77,68 +176,86 @@ async def list_users_in_channel(db, channel_id, client=None):
                 'message_count': msg_count
             })
     
-    # Sort by message count, descending
-    users.sort(key=lambda x: x['message_count'], reverse=True)
     return users
 
-async def format_message_for_export(msg, db, channel_id, client=None):
-    """Format a message for export"""
+def _display_name(user, user_id):
+    """Format a user as @username or full name, or User_<id> if unknown"""
+    if not user:
+        return f"User_{user_id}"
+    if user.get('username'):
+        return f"@{user['username']}"
+    first_name = user.get('first_name', '')
+    last_name = user.get('last_name', '')
+    return f"{first_name} {last_name}".strip()
+
+async def resolve_user_names(db, channel_id, messages, client=None):
+    """
+    Resolve display names for all senders of the messages and of their replies
+    
+    Args:
+        db: Database dictionary
+        channel_id: Channel ID as string
+        messages: Messages that will be exported
+        client: Optional Telegram client for users missing from the database
+        
+    Returns:
+        dict: Display name by user ID, keyed by from_id as stored in the messages
+    """
+    channel_msgs = db['messages'][channel_id]
+    
+    # One scan collects senders and replied-to IDs; each replied-to message
+    # is then looked up once, however often it was replied to
+    user_ids = set()
+    reply_ids = set()
+    for msg in messages:
+        user_ids.add(msg.get('from_id'))
+        reply_ids.add(msg.get('reply_to'))
+    reply_ids.discard(None)
+    for reply_msg_id in reply_ids:
+        reply_msg = channel_msgs.get(str(reply_msg_id))
+        if reply_msg is not None:
+            user_ids.add(reply_msg.get('from_id'))
+    
+    user_ids = [user_id for user_id in user_ids if user_id]
+    users = await get_users_info(client, channel_id, user_ids, db)
+    return {user_id: _display_name(user, user_id) for user_id, user in zip(user_ids, users)}
+
+def format_message_for_export(msg, channel_msgs, names):
+    """
+    Format a message for export
+    
+    Args:
+        msg: Message dictionary
+        channel_msgs: All messages of the channel by ID, used for replies
+        names: Display names from resolve_user_names
+        
+    Returns:
+        str: Formatted message text
+    """
+    get = msg.get
+    user_id = get('from_id')
+    reply_msg_id = get('reply_to')
+    views = get('views', 0)
+    forwards = get('forwards', 0)
+    reactions = get('reactions')
+    
     # Get sender information
-    sender_name = "Unknown"
-    user_id = msg.get('from_id')
-    
-    if user_id:
-        # Try to get user info from database or fetch from API if needed
-        user = None
-        if 'users' in db and channel_id in db['users'] and str(user_id) in db['users'][channel_id]:
-            user = db['users'][channel_id][str(user_id)]
-        elif client:
-            user = await get_user_info_for_id(client, channel_id, user_id, db)
-            
-        if user:
-            if user.get('username'):
-                sender_name = f"@{user['username']}"
-            else:
-                first_name = user.get('first_name', '')
-                last_name = user.get('last_name', '')
-                sender_name = f"{first_name} {last_name}".strip()
-        else:
-            sender_name = f"User_{user_id}"
+    sender_name = names[user_id] if user_id else "Unknown"
     
     # Format date
     date_str = "Unknown date"
     try:
-        date_obj = datetime.strptime(msg.get('date'), "%Y-%m-%d %H:%M:%S%z")
-        date_str = date_obj.strftime("%Y-%m-%d %H:%M:%S")
+        date_str = _parse_date(get('date')).strftime("%Y-%m-%d %H:%M:%S")
     except (ValueError, TypeError):
         pass
     
     # Check if it's a reply
     reply_text = ""
-    if msg.get('reply_to'):
-        reply_msg_id = msg.get('reply_to')
-        if reply_msg_id and str(reply_msg_id) in db['messages'][channel_id]:
-            reply_msg = db['messages'][channel_id][str(reply_msg_id)]
+    if reply_msg_id:
+        reply_msg = channel_msgs.get(str(reply_msg_id))
+        if reply_msg is not None:
             reply_sender_id = reply_msg.get('from_id')
-            reply_sender_name = "Unknown"
-            
-            if reply_sender_id:
-                # Try to get reply user info
-                reply_user = None
-                if 'users' in db and channel_id in db['users'] and str(reply_sender_id) in db['users'][channel_id]:
-                    reply_user = db['users'][channel_id][str(reply_sender_id)]
-                elif client:
-                    reply_user = await get_user_info_for_id(client, channel_id, reply_sender_id, db)
-                    
-                if reply_user:
-                    if reply_user.get('username'):
-                        reply_sender_name = f"@{reply_user['username']}"
-                    else:
-                        first = reply_user.get('first_name', '')
-                        last = reply_user.get('last_name', '')
-                        reply_sender_name = f"{first} {last}".strip()
-                else:
-                    reply_sender_name = f"User_{reply_sender_id}"
+            reply_sender_name = names[reply_sender_id] if reply_sender_id else "Unknown"
             
             reply_content = reply_msg.get('text', '')
             if len(reply_content) > 50:
@@ -146,58 +263,137 @@ async def format_message_for_export(msg, db, channel_id, client=None):
             
             reply_text = f"[Replying to {reply_sender_name}: \"{reply_content}\"]\n"
     
-    # Build message text
-    media_text = ""
-    if msg.get('has_media'):
-        media_type = msg.get('media_type', 'Unknown media')
-        media_text = f"[{media_type}]\n"
-    
-    views = msg.get('views', 0)
-    forwards = msg.get('forwards', 0)
-    
-    # Format reactions if any
-    reactions_text = ""
-    if msg.get('reactions') and len(msg.get('reactions')) > 0:
-        reactions = []
-        for reaction in msg.get('reactions'):
-            emoji = reaction.get('reaction', '👍')
-            count = reaction.get('count', 1)
-            reactions.append(f"{emoji} {count}")
-        
-        reactions_text = f" [Reactions: {', '.join(reactions)}]"
-    
-    stats_text = ""
-    if views or forwards:
-        stats_items = []
-        if views:
-            stats_items.append(f"{views} views")
-        if forwards:
-            stats_items.append(f"{forwards} forwards")
-        stats_text = f" [{', '.join(stats_items)}]"
-    
-    formatted_msg = (
-        f"[{date_str}] {sender_name}:{stats_text}{reactions_text}\n"
-        f"{reply_text}{media_text}{msg.get('text', '')}\n\n"
-    )
+    # Build the header line: stats and reactions only when present
+    header = f"[{date_str}] {sender_name}:"
+    if views and forwards:
+        header += f" [{views} views, {forwards} forwards]"
+    elif views:
+        header += f" [{views} views]"
+    elif forwards:
+        header += f" [{forwards} forwards]"
     
-    return formatted_msg
+    if reactions:
+        reactions_text = ', '.join(
+            f"{reaction.get('reaction', '👍')} {reaction.get('count', 1)}" for reaction in reactions
+        )
+        header += f" [Reactions: {reactions_text}]"
+    
+    media_text = f"[{get('media_type', 'Unknown media')}]\n" if get('has_media') else ""
+    
+    return f"{header}\n{reply_text}{media_text}{get('text', '')}\n\n"
+
+def _write_messages(f, messages, channel_msgs, names):
+    """
+    Write formatted messages to an export file in batches
+    
+    Args:
+        f: Open export file
+        messages: Sorted messages to write
+        channel_msgs: All messages of the channel by ID
+        names: Display names from resolve_user_names
+        
+    Returns:
+        int: Number of messages written
+    """
+    total = len(messages)
+    stdout_write = sys.stdout.write
+    last_progress = time.monotonic()
+    progress_shown = False
+    batch = []
+    message_count = 0
+    for msg in messages:
+        batch.append(format_message_for_export(msg, channel_msgs, names))
+        message_count += 1
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            f.write(''.join(batch))
+            batch.clear()
+            
+            # Update the progress line in place, at most every EXPORT_PROGRESS_INTERVAL
+            now = time.monotonic()
+            if now - last_progress >= EXPORT_PROGRESS_INTERVAL:
+                stdout_write(f"\rExported {message_count}/{total} messages...")
+                sys.stdout.flush()
+                last_progress = now
+                progress_shown = True
+    
+    f.write(''.join(batch))
+    if progress_shown:
+        stdout_write(f"\rExported {message_count}/{total} messages...\n")
+    return message_count
+
+def _write_export_files(filename, header, messages, channel_msgs, names):
+    """
+    Write an export, split into numbered part files for very large exports
+    
+    Exports of more than EXPORT_FILE_MAX_MESSAGES messages are written as
+    <name>_part001.txt, <name>_part002.txt, ... and each finished part is
+    dropped from the page cache where the OS supports it.
+    
+    Args:
+        filename: Export filename
+        header: Header lines written before the message count
+        messages: Sorted messages to write
+        channel_msgs: All messages of the channel by ID
+        names: Display names from resolve_user_names
+        
+    Returns:
+        list: Written filenames
+    """
+    total = len(messages)
+    separator = "-" * 80 + "\n\n"
+    if total <= EXPORT_FILE_MAX_MESSAGES:
+        with open(filename, 'w', encoding='utf-8', buffering=EXPORT_WRITE_BUFFER) as f:
+            f.write(f"{header}Total messages: {total}\n{separator}")
+            _write_messages(f, messages, channel_msgs, names)
+        return [filename]
+    
+    base = filename[:-len('.txt')] if filename.endswith('.txt') else filename
+    part_count = -(-total // EXPORT_FILE_MAX_MESSAGES)
+    filenames = []
+    for part, start in enumerate(range(0, total, EXPORT_FILE_MAX_MESSAGES), 1):
+        part_messages = messages[start:start + EXPORT_FILE_MAX_MESSAGES]
+        part_filename = f"{base}_part{part:03d}.txt"
+        with open(part_filename, 'w', encoding='utf-8', buffering=EXPORT_WRITE_BUFFER) as f:
+            f.write(
+                f"{header}Total messages: {total}\n"
+                f"Part {part} of {part_count}: messages {start + 1}-{start + len(part_messages)}\n"
+                f"{separator}"
+            )
+            _write_messages(f, part_messages, channel_msgs, names)
+            
+            # Written parts are not read again, let the OS reclaim their pages
+            if hasattr(os, 'posix_fadvise'):
+                f.flush()
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        filenames.append(part_filename)
+    return filenames
+
+def _export_result(filenames):
+    """Describe written export files and return the value the exporters return"""
+    if len(filenames) == 1:
+        return filenames[0], filenames[0]
+    return f"{len(filenames)} files ({filenames[0]} ... {filenames[-1]})", filenames
 
 async def export_channel_messages(db, channel_id, channel_title, export_dir="exports", client=None, keyword=None):
-    """Export all messages from a channel to a text file"""
+    """
+    Export all messages from a channel to a text file
+    
+    Returns the filename, a list of part filenames for very large exports,
+    or None if there was nothing to export.
+    """
     channel_id = str(channel_id)
     keyword = keyword.strip() if keyword else None
-    keyword_lower = keyword.lower() if keyword else None
     
     # Create export directory if it doesn't exist
     if not os.path.exists(export_dir):
         os.makedirs(export_dir)
     
     # Sanitize channel title for filename
-    safe_title = ''.join(c if c.isalnum() or c in [' ', '-', '_'] else '_' for c in channel_title)
-    safe_title = safe_title.strip().replace(' ', '_')
+    safe_title = _safe_filename_part(channel_title)
     
     # Create filename with channel ID and sanitized title
-    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    now = datetime.now()
+    timestamp = now.strftime("%Y%m%d_%H%M%S")
     filename = f"{export_dir}/{channel_id}_{safe_title}_{timestamp}.txt"
     
     # Check if we have messages for this channel
@@ -205,31 +401,22 @@ async def export_channel_messages(db, channel_id, channel_title, export_dir="exp
         print(f"No messages found for channel {channel_title}")
         return None
     
-    # Sort messages by date
-    messages = []
-    for msg_id, msg in db['messages'][channel_id].items():
-        try:
-            date_str = msg.get('date')
-            if date_str:
-                date_obj = datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S%z")
-                messages.append((date_obj, msg))
-        except (ValueError, TypeError):
-            # If date parsing fails, append to the end
-            messages.append((datetime.max, msg))
-    
-    messages.sort(key=lambda x: x[0])
-
+    messages = db['messages'][channel_id].values()
     original_count = len(messages)
 
-    if keyword_lower:
+    # Filter before sorting so only matching messages are sorted
+    if keyword:
+        # Case-insensitive search without lowercasing every message
+        keyword_search = re.compile(re.escape(keyword), re.IGNORECASE).search
+
         def matches_keyword(message):
-            for field in ['text', 'raw_text']:
+            for field in ('text', 'raw_text'):
                 value = message.get(field)
-                if isinstance(value, str) and keyword_lower in value.lower():
+                if isinstance(value, str) and keyword_search(value):
                     return True
             return False
 
-        messages = [(date_obj, msg) for date_obj, msg in messages if matches_keyword(msg)]
+        messages = [msg for msg in messages if matches_keyword(msg)]
 
         if not messages:
             print(f"\nNo messages containing \"{keyword}\" were found in {channel_title}.")
@@ -237,33 +424,30 @@ async def export_channel_messages(db, channel_id, channel_title, export_dir="exp
 
         print(f"\nFound {len(messages)} message(s) containing \"{keyword}\" out of {original_count} total.")
     
+    # Sort messages by date
+    messages = sort_messages_by_date(messages)
+    
+    names = await resolve_user_names(db, channel_id, messages, client)
+    
     # Write messages to file
-    message_count = 0
-    with open(filename, 'w', encoding='utf-8') as f:
-        # Write header
-        f.write(f"Export of channel: {channel_title} (ID: {channel_id})\n")
-        f.write(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        if keyword:
-            f.write(f"Filter keyword: {keyword}\n")
-        f.write(f"Total messages: {len(messages)}\n")
-        f.write("-" * 80 + "\n\n")
-        
-        # Write messages
-        for _, msg in messages:
-            formatted_msg = await format_message_for_export(msg, db, channel_id, client)
-            f.write(formatted_msg)
-            message_count += 1
-            
-            # Print progress every 100 messages
-            if message_count % 100 == 0:
-                print(f"Exported {message_count}/{len(messages)} messages...")
+    header = f"Export of channel: {channel_title} (ID: {channel_id})\n"
+    header += f"Date: {now.strftime('%Y-%m-%d %H:%M:%S')}\n"
+    if keyword:
+        header += f"Filter keyword: {keyword}\n"
+    filenames = _write_export_files(filename, header, messages, db['messages'][channel_id], names)
+    location, result = _export_result(filenames)
     
     completion_note = "messages" if not keyword else f"message(s) containing \"{keyword}\""
-    print(f"\nExport complete: {message_count} {completion_note} exported to {filename}")
-    return filename
+    print(f"\nExport complete: {len(messages)} {completion_note} exported to {location}")
+    return result
 
 async def export_user_messages(db, channel_id, channel_title, user_id, export_dir="exports", client=None):
-    """Export messages from a specific user in a channel"""
+    """
+    Export messages from a specific user in a channel
+    
+    Returns the filename, a list of part filenames for very large exports,
+    or None if there was nothing to export.
+    """
     channel_id = str(channel_id)
     user_id = str(user_id)
     
@@ -285,13 +469,12 @@ async def export_user_messages(db, channel_id, channel_title, user_id, export_di
         os.makedirs(export_dir)
     
     # Sanitize channel title and username for filename
-    safe_title = ''.join(c if c.isalnum() or c in [' ', '-', '_'] else '_' for c in channel_title)
-    safe_title = safe_title.strip().replace(' ', '_')
-    
-    safe_username = ''.join(c if c.isalnum() or c in ['-', '_'] else '_' for c in username)
+    safe_title = _safe_filename_part(channel_title)
+    safe_username = _safe_filename_part(username, _UNSAFE_USERNAME_CHARS)
     
     # Create filename
-    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    now = datetime.now()
+    timestamp = now.strftime("%Y%m%d_%H%M%S")
     filename = f"{export_dir}/{channel_id}_{safe_title}_{safe_username}_{timestamp}.txt"
     
     # Check if we have messages for this channel
@@ -299,60 +482,40 @@ async def export_user_messages(db, channel_id, channel_title, user_id, export_di
         print(f"No messages found for channel {channel_title}")
         return None
     
-    # Filter and sort messages by the specific user
-    user_messages = []
-    for msg_id, msg in db['messages'][channel_id].items():
-        if str(msg.get('from_id')) == user_id:
-            try:
-                date_str = msg.get('date')
-                if date_str:
-                    date_obj = datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S%z")
-                    user_messages.append((date_obj, msg))
-            except (ValueError, TypeError):
-                # If date parsing fails, append to the end
-                user_messages.append((datetime.max, msg))
+    # Sort the user's messages by date; the index groups them by str(from_id)
+    user_messages = sort_messages_by_date(
+        get_message_index(channel_id, db['messages'][channel_id])['by_user'].get(str(user_id), [])
+    )
     
     if not user_messages:
         print(f"No messages found for user {username} in channel {channel_title}")
         return None
     
-    user_messages.sort(key=lambda x: x[0])
+    names = await resolve_user_names(db, channel_id, user_messages, client)
     
     # Write messages to file
-    message_count = 0
-    with open(filename, 'w', encoding='utf-8') as f:
-        # Write header
-        f.write(f"Export of messages by ")
-        if user_info:
-            if user_info.get('username'):
-                f.write(f"@{user_info['username']}")
-            else:
-                f.write(f"{user_info.get('first_name', '')} {user_info.get('last_name', '')}".strip())
+    header = "Export of messages by "
+    if user_info:
+        if user_info.get('username'):
+            header += f"@{user_info['username']}"
         else:
-            f.write(f"User ID: {user_id}")
-        
-        f.write(f" in channel: {channel_title} (ID: {channel_id})\n")
-        f.write(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"Total messages: {len(user_messages)}\n")
-        f.write("-" * 80 + "\n\n")
-        
-        # Write messages
-        for _, msg in user_messages:
-            formatted_msg = await format_message_for_export(msg, db, channel_id, client)
-            f.write(formatted_msg)
-            message_count += 1
-            
-            # Print progress every 100 messages
-            if message_count % 100 == 0:
-                print(f"Exported {message_count}/{len(user_messages)} messages...")
-    
-    print(f"\nExport complete: {message_count} messages exported to {filename}")
-    return filename
+            header += f"{user_info.get('first_name', '')} {user_info.get('last_name', '')}".strip()
+    else:
+        header += f"User ID: {user_id}"
+    header += f" in channel: {channel_title} (ID: {channel_id})\n"
+    header += f"Date: {now.strftime('%Y-%m-%d %H:%M:%S')}\n"
+    filenames = _write_export_files(filename, header, user_messages, db['messages'][channel_id], names)
+    location, result = _export_result(filenames)
+    
+    print(f"\nExport complete: {len(user_messages)} messages exported to {location}")
+    return result
 
 async def get_user_info_for_id(client, channel_id, user_id, db):
     """
     Fetch user information for a given user ID from the channel
     Try to find it in the database first, if not found, fetch from Telegram API
+    Fetched users are kept in the database, and failed lookups are not
+    retried for USER_LOOKUP_RETRY_TTL seconds.
     """
     user_id = str(user_id)
     
@@ -360,6 +523,12 @@ async def get_user_info_for_id(client, channel_id, user_id, db):
     if 'users' in db and channel_id in db['users'] and user_id in db['users'][channel_id]:
         return db['users'][channel_id][user_id]
     
+    # Skip users that recently failed to resolve
+    key = (channel_id, user_id)
+    failed_at = _failed_user_lookups.get(key)
+    if failed_at is not None and time.monotonic() - failed_at < USER_LOOKUP_RETRY_TTL:
+        return None
+    
     # User not found in database, fetch from API if client is provided
     if client:
         try:
@@ -373,6 +542,7 @@ async def get_user_info_for_id(client, channel_id, user_id, db):
             entity = await client.get_entity(int(user_id))
             
             # Save user info
+            seen = str(datetime.now())
             user_dict = {
                 'id': entity.id,
                 'username': entity.username,
@@ -385,8 +555,8 @@ async def get_user_info_for_id(client, channel_id, user_id, db):
                 'premium': getattr(entity, 'premium', False),
                 'verified': getattr(entity, 'verified', False),
                 'restricted': getattr(entity, 'restricted', False),
-                'first_seen': str(datetime.now()),
-                'last_seen': str(datetime.now())
+                'first_seen': seen,
+                'last_seen': seen
             }
             
             # Save to database
@@ -396,10 +566,37 @@ async def get_user_info_for_id(client, channel_id, user_id, db):
             return user_dict
         except Exception as e:
             logger.error(f"Error fetching user info for {user_id}: {str(e)}")
+            _failed_user_lookups[key] = time.monotonic()
             return None
     
     return None
 
+async def get_users_info(client, channel_id, user_ids, db):
+    """
+    Look up several users concurrently with get_user_info_for_id
+    
+    At most USER_LOOKUP_CONCURRENCY API requests run at the same time
+    to stay clear of flood waits.
+    
+    Args:
+        client: Telegram client
+        channel_id: Channel ID as string
+        user_ids: User IDs to look up
+        db: Database dictionary
+        
+    Returns:
+        list: User info dicts, or None for users that could not be found,
+            in the order of user_ids
+    """
+    semaphore = asyncio.Semaphore(USER_LOOKUP_CONCURRENCY)
+    
+    async def lookup(user_id):
+        async with semaphore:
+            return await get_user_info_for_id(client, channel_id, user_id, db)
+    
+    results = await asyncio.gather(*(lookup(user_id) for user_id in user_ids), return_exceptions=True)
+    return [None if isinstance(result, BaseException) else result for result in results]
+
 async def export_menu(db, client=None):
     """Display export options menu"""
     if not db.get('active_channel'):
@@ -441,8 +638,11 @@ async def export_menu(db, client=None):
         print(f"\nExporting all messages from {channel_title}...")
         await export_channel_messages(db, channel_id, channel_title, client=client)
     elif choice == '2':
-        # List users and export messages from a specific user
-        users = await list_users_in_channel(db, channel_id, client=client)
+        # List the most active users and export messages from one of them
+        counts = count_messages_per_user(db, channel_id)
+        users = await list_users_in_channel(
+            db, channel_id, client=client, limit=EXPORT_MENU_USERS_SHOWN, counts=counts
+        )
         
         if not users:
             print("\nNo users found in this channel!")
@@ -450,12 +650,12 @@ async def export_menu(db, client=None):
         
         print("\nUsers in this channel:")
         print("-" * 50)
-        for i, user in enumerate(users[:30], 1):  # Show top 30 users by message count
+        for i, user in enumerate(users, 1):
             username = user['username'] or f"{user['first_name']} {user['last_name']}"
             print(f"{i}. {username} - {user['message_count']} messages")
         
-        if len(users) > 30:
-            print(f"... and {len(users) - 30} more users")
+        if len(counts) > len(users):
+            print(f"... and {len(counts) - len(users)} more users")
         
         print("0. Cancel")
         
@@ -481,8 +681,8 @@ async def export_menu(db, client=None):
         
         # Check if OpenRouter API key is configured
         # Load environment variables fresh to catch any updates
-        from dotenv import load_dotenv
-        load_dotenv()
+        from src.config import load_env
+        load_env()
         import os
         api_key = os.getenv('OPENROUTER_API_KEY')
         if api_key:
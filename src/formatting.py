@@ -3,9 +3,11 @@ Formatting preservation utilities for search and replace.
 Uses Telegram's native entity format (raw_text + entities).
 """
 import re
-import copy
+import sys
+import bisect
+import functools
+from collections import OrderedDict
 from telethon.tl import types
-from telethon.extensions import markdown
 
 # All supported entity types for serialization/deserialization
 ENTITY_TYPES = {
@@ -29,6 +31,75 @@ ENTITY_TYPES = {
     'MessageEntityCustomEmoji': types.MessageEntityCustomEmoji,
 }
 
+# Constructors taking (offset, length, entity dict) for each entity type;
+# types with extra fields read them from the dict
+_ENTITY_BUILDERS = {
+    'MessageEntityTextUrl': lambda offset, length, d: types.MessageEntityTextUrl(offset, length, d.get('url', '')),
+    'MessageEntityPre': lambda offset, length, d: types.MessageEntityPre(offset, length, d.get('language', '')),
+    'MessageEntityMentionName': lambda offset, length, d: types.MessageEntityMentionName(
+        offset, length, d.get('user_id', 0)
+    ),
+    'MessageEntityCustomEmoji': lambda offset, length, d: types.MessageEntityCustomEmoji(
+        offset, length, d.get('document_id', 0)
+    ),
+    'MessageEntityBlockquote': lambda offset, length, d: types.MessageEntityBlockquote(
+        offset, length, collapsed=d.get('collapsed', False)
+    ),
+}
+for _name, _cls in ENTITY_TYPES.items():
+    _ENTITY_BUILDERS.setdefault(_name, lambda offset, length, d, cls=_cls: cls(offset, length))
+del _name, _cls
+
+# Attributes serialized besides offset and length, per entity class
+_EXTRA_ATTRS = {
+    types.MessageEntityTextUrl: ('url',),
+    types.MessageEntityPre: ('language',),
+    types.MessageEntityMentionName: ('user_id',),
+    types.MessageEntityCustomEmoji: ('document_id',),
+    types.MessageEntityBlockquote: ('collapsed',),
+}
+_EXTRA_FIELDS = {cls.__name__: names for cls, names in _EXTRA_ATTRS.items()}
+
+# Rendered markdown keyed by raw_text and entity fields, most recent last
+_MARKDOWN_CACHE_SIZE = 512
+_markdown_cache = OrderedDict()
+
+
+@functools.lru_cache(maxsize=256)
+def _get_pattern(search, case_sensitive):
+    """
+    Get the compiled literal pattern for a search string.
+
+    Bulk replace runs the same search over many messages, so patterns
+    are compiled once and reused.
+
+    Args:
+        search: Text to find
+        case_sensitive: Whether search is case sensitive
+
+    Returns:
+        re.Pattern: Compiled pattern matching search literally
+    """
+    return re.compile(re.escape(search), 0 if case_sensitive else re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=64)
+def _get_alternation_pattern(searches, case_sensitive):
+    """
+    Get one compiled pattern matching any of several search strings.
+
+    Each search is its own group, so match.lastindex tells which one matched.
+
+    Args:
+        searches: Tuple of texts to find
+        case_sensitive: Whether search is case sensitive
+
+    Returns:
+        re.Pattern: Compiled alternation pattern
+    """
+    alternation = '|'.join('(' + re.escape(search) + ')' for search in searches)
+    return re.compile(alternation, 0 if case_sensitive else re.IGNORECASE)
+
 
 def entity_to_dict(entity):
     """
@@ -43,27 +114,53 @@ def entity_to_dict(entity):
     if entity is None:
         return None
 
+    cls = type(entity)
     d = {
-        '_type': type(entity).__name__,
+        '_type': cls.__name__,
         'offset': entity.offset,
         'length': entity.length
     }
 
     # Type-specific attributes
-    if hasattr(entity, 'url') and entity.url:
-        d['url'] = entity.url
-    if hasattr(entity, 'language') and entity.language:
-        d['language'] = entity.language
-    if hasattr(entity, 'user_id') and entity.user_id:
-        d['user_id'] = entity.user_id
-    if hasattr(entity, 'document_id') and entity.document_id:
-        d['document_id'] = entity.document_id
-    if hasattr(entity, 'collapsed') and entity.collapsed:
-        d['collapsed'] = entity.collapsed
+    for name in _EXTRA_ATTRS.get(cls, ()):
+        value = getattr(entity, name, None)
+        if value:
+            d[name] = value
 
     return d
 
 
+def _copy_entity_dict(d):
+    """
+    Copy an entity dict in the form entity_to_dict produces.
+
+    Same result as entity_to_dict(dict_to_entity(d)) without building
+    the Telethon object in between.
+
+    Args:
+        d: Dictionary with entity data
+
+    Returns:
+        dict: Normalized copy, or None if type unknown
+    """
+    if not d or d.get('_type') not in _ENTITY_BUILDERS:
+        return None
+
+    # Type names read from the database are fresh strings per entity;
+    # interning lets every copy share one
+    entity_type = sys.intern(d['_type'])
+    copy = {
+        '_type': entity_type,
+        'offset': d.get('offset', 0),
+        'length': d.get('length', 0)
+    }
+    for name in _EXTRA_FIELDS.get(entity_type, ()):
+        value = d.get(name)
+        if value:
+            copy[name] = value
+    return copy
+
+
 def dict_to_entity(d):
     """
     Convert a dict back to a MessageEntity object.
@@ -77,28 +174,12 @@ def dict_to_entity(d):
     if not d or '_type' not in d:
         return None
 
-    entity_type = d['_type']
-    offset = d.get('offset', 0)
-    length = d.get('length', 0)
-
-    cls = ENTITY_TYPES.get(entity_type)
-    if not cls:
+    builder = _ENTITY_BUILDERS.get(d['_type'])
+    if not builder:
         return None
 
-    # Handle different constructor signatures
     try:
-        if entity_type == 'MessageEntityTextUrl':
-            return cls(offset, length, d.get('url', ''))
-        elif entity_type == 'MessageEntityPre':
-            return cls(offset, length, d.get('language', ''))
-        elif entity_type == 'MessageEntityMentionName':
-            return cls(offset, length, d.get('user_id', 0))
-        elif entity_type == 'MessageEntityCustomEmoji':
-            return cls(offset, length, d.get('document_id', 0))
-        elif entity_type == 'MessageEntityBlockquote':
-            return cls(offset, length, collapsed=d.get('collapsed', False))
-        else:
-            return cls(offset, length)
+        return builder(d.get('offset', 0), d.get('length', 0), d)
     except Exception:
         return None
 
@@ -130,8 +211,150 @@ def dicts_to_entities(dicts):
     """
     if not dicts:
         return []
-    entities = [dict_to_entity(d) for d in dicts]
-    return [e for e in entities if e is not None]
+    entities = []
+    append = entities.append
+    for d in dicts:
+        e = dict_to_entity(d)
+        if e is not None:
+            append(e)
+    return entities
+
+
+def _find_spans(raw_text, search, case_sensitive):
+    """
+    Find all non-overlapping occurrences of search as (start, end) spans.
+
+    Uses str.find on the text, or on its casefolded copy, which is much
+    cheaper than the regex engine for a literal search. Case-insensitive
+    search falls back to the regex when casefolding changes the length,
+    which would shift offsets, or for the dotless i, which the regex
+    treats as a case variant of i.
+
+    Args:
+        raw_text: Plain text to search
+        search: Text to find
+        case_sensitive: Whether search is case sensitive
+
+    Returns:
+        list: (start, end) tuples in text order
+    """
+    if case_sensitive:
+        text, needle = raw_text, search
+    else:
+        text, needle = raw_text.casefold(), search.casefold()
+        if len(text) != len(raw_text) or len(needle) != len(search) or '\u0131' in text or '\u0131' in needle:
+            return [match.span() for match in _get_pattern(search, False).finditer(raw_text)]
+
+    spans = []
+    size = len(needle)
+    index = text.find(needle)
+    while index != -1:
+        spans.append((index, index + size))
+        index = text.find(needle, index + size)
+    return spans
+
+
+def _replace_matches(raw_text, entities, matches, replace_url):
+    """
+    Replace the given matches and adjust entity offsets and lengths.
+
+    Args:
+        raw_text: Plain text without formatting markers
+        entities: List of MessageEntity objects or dicts
+        matches: (start, end, replacement) tuples in text order
+        replace_url: Function applying the same replacement to a URL
+
+    Returns:
+        tuple: (new_raw_text, new_entities_as_dicts, replacement_count, url_count)
+    """
+    # Work on fresh entity dicts; stored dicts are copied without building
+    # Telethon objects
+    entity_dicts = []
+    for e in (entities or []):
+        e = _copy_entity_dict(e) if isinstance(e, dict) else entity_to_dict(e)
+        if e is not None:
+            entity_dicts.append(e)
+
+    # Telegram sends entities in offset order, so usually no sort is needed
+    if any(a['offset'] > b['offset'] for a, b in zip(entity_dicts, entity_dicts[1:])):
+        entity_dicts.sort(key=lambda e: e['offset'])
+
+    # Find all matches in the original text and build the new text once
+    starts = []
+    ends = []
+    replacements = []
+    pieces = []
+    prev_end = 0
+    for start, end, replacement in matches:
+        starts.append(start)
+        ends.append(end)
+        replacements.append(replacement)
+        pieces.append(raw_text[prev_end:start])
+        pieces.append(replacement)
+        prev_end = end
+    pieces.append(raw_text[prev_end:])
+    new_text = ''.join(pieces)
+    replacement_count = len(starts)
+
+    # shift_before[k]: total length change of the matches before match k
+    shift_before = [0]
+    for start, end, replacement in zip(starts, ends, replacements):
+        shift_before.append(shift_before[-1] + len(replacement) - (end - start))
+
+    # Adjust entity offsets and lengths, in original text coordinates
+    # Entities are sorted by offset, so the first match that can touch an
+    # entity never moves back and each lookup starts where the last one ended
+    new_entities = []
+    url_count = 0
+    first = 0
+    for ent_dict in entity_dicts:
+        ent_start = ent_dict['offset']
+        ent_end = ent_start + ent_dict['length']
+
+        offset = ent_start
+        length = ent_dict['length']
+
+        # Without matches in the text, only URLs can change
+        if starts:
+            # Matches completely BEFORE the entity only shift it
+            first = bisect.bisect_right(ends, ent_start, first)
+            offset += shift_before[first]
+
+            # Only matches overlapping the entity change it further
+            for k in range(first, bisect.bisect_left(starts, ent_end)):
+                start = starts[k]
+                end = ends[k]
+
+                # Entity CONTAINS the replacement (replacement is inside entity)
+                if ent_start <= start and ent_end >= end:
+                    length += len(replacements[k]) - (end - start)
+
+                # Replacement OVERLAPS entity start (partial overlap from left)
+                elif start < ent_start:
+                    offset = start + shift_before[k] + len(replacements[k])
+                    length = max(0, length - (end - ent_start))
+
+                # Replacement OVERLAPS entity end (partial overlap from right)
+                else:
+                    length = max(0, length - (ent_end - start))
+
+        # Drop entities that lost all their text
+        if length <= 0:
+            continue
+
+        ent_dict['offset'] = offset
+        ent_dict['length'] = length
+
+        # Also replace in URL attributes of TextUrl entities
+        if 'url' in ent_dict:
+            url = replace_url(ent_dict['url'])
+            if url != ent_dict['url']:
+                ent_dict['url'] = url
+                url_count += 1
+
+        new_entities.append(ent_dict)
+
+    return new_text, new_entities, replacement_count, url_count
 
 
 def search_replace_with_entities(raw_text, entities, search, replace, case_sensitive=True):
@@ -147,87 +370,79 @@ def search_replace_with_entities(raw_text, entities, search, replace, case_sensi
         case_sensitive: Whether search is case sensitive
 
     Returns:
-        tuple: (new_raw_text, new_entities_as_dicts, replacement_count)
+        tuple: (new_raw_text, new_entities_as_dicts, replacement_count, url_count)
     """
     if not raw_text or not search:
-        return raw_text, entities_to_dicts(entities) if entities else [], 0
+        return raw_text, entities_to_dicts(entities) if entities else [], 0, 0
 
-    # Convert dicts to entity objects if needed
-    entity_objs = []
-    for e in (entities or []):
-        if isinstance(e, dict):
-            obj = dict_to_entity(e)
-            if obj:
-                entity_objs.append(obj)
-        else:
-            entity_objs.append(copy.copy(e))
-
-    entity_objs = sorted(entity_objs, key=lambda e: e.offset)
-
-    new_text = raw_text
-    offset_delta = 0
-    replacement_count = 0
-
-    # Build regex pattern
-    flags = 0 if case_sensitive else re.IGNORECASE
-    pattern = re.compile(re.escape(search), flags)
-
-    # Find all matches in original text
-    for match in pattern.finditer(raw_text):
-        start = match.start()
-        end = match.end()
-        len_diff = len(replace) - len(search)
-
-        # Apply replacement at adjusted position
-        adjusted_start = start + offset_delta
-        new_text = new_text[:adjusted_start] + replace + new_text[adjusted_start + len(search):]
-        replacement_count += 1
-
-        # Adjust entity offsets and lengths
-        for ent in entity_objs:
-            ent_start = ent.offset
-            ent_end = ent.offset + ent.length
-
-            # Entity is completely AFTER the replacement
-            if ent_start >= end:
-                ent.offset += len_diff
-
-            # Entity CONTAINS the replacement (replacement is inside entity)
-            elif ent_start <= start and ent_end >= end:
-                ent.length += len_diff
-
-            # Replacement OVERLAPS entity start (partial overlap from left)
-            elif start < ent_start < end:
-                overlap = end - ent_start
-                ent.offset = adjusted_start + len(replace)
-                ent.length = max(0, ent.length - overlap)
-
-            # Replacement OVERLAPS entity end (partial overlap from right)
-            elif start < ent_end <= end:
-                overlap = ent_end - start
-                ent.length = max(0, ent.length - overlap)
-
-        offset_delta += len_diff
-
-    # Also replace in URL attributes of TextUrl entities
-    for ent in entity_objs:
-        if isinstance(ent, types.MessageEntityTextUrl) and ent.url:
-            if case_sensitive:
-                ent.url = ent.url.replace(search, replace)
-            else:
-                # Case-insensitive URL replacement
-                ent.url = re.sub(re.escape(search), replace, ent.url, flags=re.IGNORECASE)
-
-    # Remove zero-length entities and convert back to dicts
-    new_entities = [entity_to_dict(e) for e in entity_objs if e.length > 0]
-
-    return new_text, new_entities, replacement_count
+    pattern = _get_pattern(search, case_sensitive)
+    matches = ((start, end, replace) for start, end in _find_spans(raw_text, search, case_sensitive))
+
+    # A function replacement keeps backslashes in replace literal
+    return _replace_matches(
+        raw_text, entities, matches, lambda url: pattern.sub(lambda match: replace, url)
+    )
+
+
+def search_replace_many_with_entities(raw_text, entities, pairs, case_sensitive=True):
+    """
+    Replace several search strings in one pass while adjusting entities.
+
+    At the same position the earlier pair wins, as with a regex alternation.
+
+    Args:
+        raw_text: Plain text without formatting markers
+        entities: List of MessageEntity objects or dicts
+        pairs: List of (search, replace) tuples
+        case_sensitive: Whether search is case sensitive
+
+    Returns:
+        tuple: (new_raw_text, new_entities_as_dicts, replacement_count, url_count)
+    """
+    pairs = [(search, replace) for search, replace in pairs if search]
+    if not raw_text or not pairs:
+        return raw_text, entities_to_dicts(entities) if entities else [], 0, 0
+
+    pattern = _get_alternation_pattern(tuple(search for search, _ in pairs), case_sensitive)
+    replacements = [replace for _, replace in pairs]
+
+    def replacement_for(match):
+        return replacements[match.lastindex - 1]
+
+    matches = (
+        (match.start(), match.end(), replacement_for(match)) for match in pattern.finditer(raw_text)
+    )
+    return _replace_matches(raw_text, entities, matches, lambda url: pattern.sub(replacement_for, url))
+
+
+def _markdown_cache_key(raw_text, entities):
+    """
+    Build a hashable cache key for rendering raw_text with entity dicts.
+
+    Args:
+        raw_text: Plain text
+        entities: List of entity dicts or MessageEntity objects
+
+    Returns:
+        tuple: Cache key, or None if an entity is not a hashable dict
+    """
+    # Entity dicts hold only strings, numbers and booleans, so their items
+    # are the key; URLs are part of it, so a URL-only edit renders once
+    try:
+        key = (raw_text, tuple(tuple(d.items()) for d in entities))
+        hash(key)
+    except (AttributeError, TypeError):
+        return None
+    return key
 
 
 def entities_to_markdown(raw_text, entities):
     """
     Convert raw_text + entities to markdown for display.
 
+    Results for entity dicts are memoized, since previews and the final
+    replace render the same message more than once.
+
     Args:
         raw_text: Plain text
         entities: List of entity dicts or MessageEntity objects
@@ -238,13 +453,48 @@ def entities_to_markdown(raw_text, entities):
     if not raw_text:
         return ''
 
+    key = _markdown_cache_key(raw_text, entities or [])
+    if key is not None:
+        cached = _markdown_cache.get(key)
+        if cached is not None:
+            _markdown_cache.move_to_end(key)
+            return cached
+
+    from telethon.extensions import markdown
+
     entity_objs = dicts_to_entities(entities) if entities else []
 
     try:
-        return markdown.unparse(raw_text, entity_objs)
+        result = markdown.unparse(raw_text, entity_objs)
     except Exception:
         # Fallback to raw text if unparse fails
-        return raw_text
+        result = raw_text
+
+    if key is not None:
+        _markdown_cache[key] = result
+        if len(_markdown_cache) > _MARKDOWN_CACHE_SIZE:
+            _markdown_cache.popitem(last=False)
+    return result
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_markdown(text):
+    """
+    Parse markdown once per distinct text.
+
+    Legacy messages without stored entities are parsed again on every
+    preview and replace, so results are cached.
+
+    Args:
+        text: Markdown-formatted text
+
+    Returns:
+        tuple: (raw_text, tuple_of_entity_dicts)
+    """
+    from telethon.extensions import markdown
+
+    raw_text, entity_objs = markdown.parse(text)
+    return raw_text, tuple(entities_to_dicts(entity_objs))
 
 
 def get_entities_from_markdown(text):
@@ -262,8 +512,9 @@ def get_entities_from_markdown(text):
         return '', []
 
     try:
-        raw_text, entity_objs = markdown.parse(text)
-        return raw_text, entities_to_dicts(entity_objs)
+        raw_text, entities = _parse_markdown(text)
+        # Copies keep callers from changing the cached entities
+        return raw_text, [dict(d) for d in entities]
     except Exception:
         # If parsing fails, return text as-is with no entities
         return text, []
@@ -313,38 +564,134 @@ def apply_replacement_to_message(message_dict, search, replace, case_sensitive=T
     if not raw_text:
         return None
 
-    # Check if search term exists
-    if case_sensitive:
-        if search not in raw_text:
-            # Also check URLs in entities
-            has_url_match = False
-            for ent in entities:
-                if isinstance(ent, dict) and ent.get('url') and search in ent['url']:
-                    has_url_match = True
-                    break
-            if not has_url_match:
-                return None
-    else:
-        if search.lower() not in raw_text.lower():
-            has_url_match = False
-            for ent in entities:
-                if isinstance(ent, dict) and ent.get('url') and search.lower() in ent['url'].lower():
-                    has_url_match = True
-                    break
-            if not has_url_match:
-                return None
+    # Check if search term exists, in the text or in entity URLs
+    if not _contains_any(raw_text, entities, [search], case_sensitive):
+        return None
 
     # Apply replacement
-    new_raw, new_entities, count = search_replace_with_entities(
+    new_raw, new_entities, count, url_count = search_replace_with_entities(
         raw_text, entities, search, replace, case_sensitive
     )
 
-    if count == 0:
-        # Check if only URL was changed
-        old_urls = [e.get('url', '') for e in entities if isinstance(e, dict)]
-        new_urls = [e.get('url', '') for e in new_entities if isinstance(e, dict)]
-        if old_urls == new_urls:
-            return None
+    return _replacement_result(new_raw, new_entities, count, url_count)
+
+
+def count_matches_in_message(message_dict, search, case_sensitive=True):
+    """
+    Count where a search string would be replaced in a message.
+
+    Same result as checking apply_replacement_to_message for None, but
+    without adjusting entities or rendering markdown.
+
+    Args:
+        message_dict: Message dictionary from database
+        search: Text to find
+        case_sensitive: Whether search is case sensitive
+
+    Returns:
+        int: Matches in the text plus entity URLs containing search
+    """
+    raw_text, entities = get_message_entities(message_dict)
+
+    if not raw_text or not search:
+        return 0
+
+    if not _contains_any(raw_text, entities, [search], case_sensitive):
+        return 0
+
+    count = len(_find_spans(raw_text, search, case_sensitive))
+    pattern = _get_pattern(search, case_sensitive)
+    for ent in entities:
+        url = ent.get('url') if isinstance(ent, dict) else None
+        if url and pattern.search(url):
+            count += 1
+    return count
+
+
+def apply_replacements_to_message(message_dict, pairs, case_sensitive=True):
+    """
+    Apply several search-replace pairs to a message in a single pass.
+
+    The text is scanned and the markdown rendered once, however many
+    pairs there are.
+
+    Args:
+        message_dict: Original message dictionary
+        pairs: List of (search, replace) tuples
+        case_sensitive: Whether search is case sensitive
+
+    Returns:
+        dict: Updated fields (raw_text, entities, text) or None if no changes
+    """
+    raw_text, entities = get_message_entities(message_dict)
+
+    # Handle None or empty raw_text
+    if not raw_text:
+        return None
+
+    pairs = [(search, replace) for search, replace in pairs if search]
+    if not pairs or not _contains_any(raw_text, entities, [search for search, _ in pairs], case_sensitive):
+        return None
+
+    new_raw, new_entities, count, url_count = search_replace_many_with_entities(
+        raw_text, entities, pairs, case_sensitive
+    )
+
+    return _replacement_result(new_raw, new_entities, count, url_count)
+
+
+def _contains_any(raw_text, entities, searches, case_sensitive):
+    """
+    Check whether any search string occurs in the text or in an entity URL.
+
+    Args:
+        raw_text: Plain text
+        entities: List of entity dicts
+        searches: Texts to find
+        case_sensitive: Whether search is case sensitive
+
+    Returns:
+        bool: True if at least one search string was found
+    """
+    # An exact hit is also a case-insensitive one, so casefold copies are
+    # only made when the plain check fails
+    folded = None if case_sensitive else [search.casefold() for search in searches]
+
+    if any(search in raw_text for search in searches):
+        return True
+    if folded:
+        raw_text = raw_text.casefold()
+        if any(search in raw_text for search in folded):
+            return True
+
+    for ent in entities:
+        url = ent.get('url') if isinstance(ent, dict) else None
+        if not url:
+            continue
+        if any(search in url for search in searches):
+            return True
+        if folded:
+            url = url.casefold()
+            if any(search in url for search in folded):
+                return True
+    return False
+
+
+def _replacement_result(new_raw, new_entities, count, url_count):
+    """
+    Build the updated message fields after a replacement.
+
+    Args:
+        new_raw: Raw text after the replacement
+        new_entities: Entity dicts after the replacement
+        count: Number of replacements in the text
+        url_count: Number of entity URLs that changed
+
+    Returns:
+        dict: Updated fields (raw_text, entities, text) or None if no changes
+    """
+    if count == 0 and url_count == 0:
+        return None
 
     # Generate new markdown
     new_markdown = entities_to_markdown(new_raw, new_entities)
@@ -353,5 +700,6 @@ def apply_replacement_to_message(message_dict, search, replace, case_sensitive=T
         'raw_text': new_raw,
         'entities': new_entities,
         'text': new_markdown,
-        'replacement_count': count
+        'replacement_count': count,
+        'url_count': url_count
     }
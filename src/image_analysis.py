@@ -58,8 +58,8 @@ def analyze_image_with_openrouter(image_path: str, prompt: str = None) -> Dict[s
         Dict containing analysis result or error information
     """
     # Reload environment variables to catch any updates
-    from dotenv import load_dotenv
-    load_dotenv()
+    from src.config import load_env
+    load_env()
     api_key = os.getenv('OPENROUTER_API_KEY')
     
     if not api_key:
@@ -179,8 +179,8 @@ def analyze_multiple_images(image_paths: list, prompt: str = None) -> Dict[str,
         Dict containing analysis result or error information
     """
     # Reload environment variables to catch any updates
-    from dotenv import load_dotenv
-    load_dotenv()
+    from src.config import load_env
+    load_env()
     api_key = os.getenv('OPENROUTER_API_KEY')
     
     if not api_key:
@@ -232,7 +232,7 @@ async def download_video_messages(client, db, db_path, limit=None, round_videos_
     """
     from telethon.tl.types import InputMessagesFilterRoundVideo, InputMessagesFilterVideo
     from src.channels import get_active_channel
-    from src.database import save_database
+    from src.database import save_channel_items
     
     active = get_active_channel(db)
     if not active:
@@ -267,6 +267,8 @@ async def download_video_messages(client, db, db_path, limit=None, round_videos_
         # Progress tracking
         start_time = datetime.now()
         last_save_time = start_time
+        # Downloaded videos not yet written to the database
+        unsaved_videos = {}
         
         # Define the video filter
         video_filter = InputMessagesFilterRoundVideo() if round_videos_only else InputMessagesFilterVideo()
@@ -343,12 +345,14 @@ async def download_video_messages(client, db, db_path, limit=None, round_videos_
                     
                     # Save to database
                     db['videos'][channel_id][msg_id] = video_info
+                    unsaved_videos[msg_id] = video_info
                     downloaded += 1
                     
-                    # Save database periodically
+                    # Save new videos periodically, all in one transaction
                     current_time = datetime.now()
                     if (current_time - last_save_time).total_seconds() > 300:  # 5 minutes
-                        save_database(db_path, db)
+                        save_channel_items(db_path, 'videos', channel_id, unsaved_videos)
+                        unsaved_videos = {}
                         last_save_time = current_time
                 else:
                     # Handle download failure
@@ -373,7 +377,8 @@ async def download_video_messages(client, db, db_path, limit=None, round_videos_
                 continue
         
         # Final save
-        save_database(db_path, db)
+        if unsaved_videos:
+            save_channel_items(db_path, 'videos', channel_id, unsaved_videos)
         
         # Final statistics
         end_time = datetime.now()
@@ -3,20 +3,271 @@ Messages management module.
 Handles operations related to Telegram channel messages.
 """
 import os
+import sys
 import logging
 import asyncio
 import html
+import time
+import shutil
+import bisect
+import functools
+import unicodedata
 from datetime import datetime
 
-from src.config import MESSAGES_BATCH_SIZE, BATCH_DELAY, SAVE_INTERVAL, MAX_RETRIES, MEDIA_DOWNLOAD_DELAY
+from src.config import (
+    MESSAGES_BATCH_SIZE, BATCH_DELAY, MAX_RETRIES, MEDIA_DOWNLOAD_DELAY,
+    MEDIA_DOWNLOAD_CONCURRENCY, PROGRESS_REFRESH_INTERVAL, VERBOSE, BROWSE_PAGE_SIZE
+)
 from src.channels import get_active_channel
-from src.database import save_database
+from src.database import save_channel_items
 from src.media import download_media_safely
 from src.formatting import entities_to_dicts
 from telethon import types
 
 logger = logging.getLogger(__name__)
 
+# channel_id -> ((dict id, message count), index) from get_message_index
+_search_index_cache = {}
+# channel_id -> ((dict id, message count), sorted message IDs) for browse_messages
+_browse_order_cache = {}
+
+def _message_reactions(message):
+    """
+    Convert the reactions of a Telegram message to a list of dicts
+
+    Args:
+        message: Telethon message
+
+    Returns:
+        list: Reaction dicts with emoticon, document_id, count and chosen
+    """
+    reactions = []
+    if message.reactions:
+        for reaction in message.reactions.results:
+            try:
+                reactions.append({
+                    'emoticon': reaction.reaction.emoticon if hasattr(reaction.reaction, 'emoticon') else None,
+                    'document_id': reaction.reaction.document_id if hasattr(reaction.reaction, 'document_id') else None,
+                    'count': reaction.count,
+                    'chosen': getattr(reaction, 'chosen', False)
+                })
+            except Exception as e:
+                logger.debug(f"Skipping malformed reaction in message {message.id}: {str(e)}")
+    return reactions
+
+def _build_message_dict(message, reactions, now_str):
+    """
+    Create the stored dict for a Telegram message with all available fields
+
+    Args:
+        message: Telethon message
+        reactions: Reaction dicts from _message_reactions
+        now_str: Timestamp string for last_update, shared by the batch
+
+    Returns:
+        dict: Message dict; media_file_path is filled in by the caller
+    """
+    return {
+        'id': message.id,
+        'date': str(message.date),
+        'edit_date': str(message.edit_date) if message.edit_date else None,
+        'from_id': message.from_id.user_id if message.from_id else None,
+        'post_author': message.post_author,  # Get channel post author
+        'text': message.text,
+        'raw_text': message.raw_text,
+        'entities': entities_to_dicts(message.entities),  # Store native Telegram entities
+        'text_html': message.text,  # Telethon messages have no separate HTML text
+        'out': message.out,
+        'mentioned': message.mentioned,
+        'media_unread': message.media_unread,
+        'silent': message.silent,
+        'post': message.post,
+        'from_scheduled': message.from_scheduled,
+        'legacy': message.legacy,
+        'edit_hide': message.edit_hide,
+        'pinned': message.pinned,
+        'noforwards': message.noforwards,
+        'views': message.views,
+        'forwards': message.forwards,
+        'has_media': bool(message.media),
+        'media_type': type(message.media).__name__ if message.media else None,
+        'media_file_path': None,  # Will store path to downloaded media
+        'grouped_id': str(message.grouped_id) if message.grouped_id else None,
+        'reactions': reactions,
+        'reply_to': message.reply_to.reply_to_msg_id if message.reply_to else None,
+        'last_update': now_str
+    }
+
+async def _boundary_message(client, peer, reverse):
+    """
+    Fetch the oldest or newest message of a chat
+
+    Args:
+        client: Telegram client
+        peer: Chat ID
+        reverse: True for the oldest message, False for the newest
+
+    Returns:
+        Message: The message, or None if the chat is empty
+    """
+    async for msg in client.iter_messages(peer, limit=1, reverse=reverse):
+        return msg
+    return None
+
+def _file_size(path):
+    """
+    Get the size of a file with a single stat call
+
+    Args:
+        path: File path
+
+    Returns:
+        int: Size in bytes, or None if the file does not exist
+    """
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+def _is_unchanged(existing, message, reactions, download_media, media_on_disk):
+    """
+    Check whether a stored message is up to date without building its dict
+
+    Matches the update check in save_channel_messages: views, forwards,
+    reactions and, when downloading media, the media file path.
+
+    Args:
+        existing: Stored message dict
+        message: Telethon message
+        reactions: Reaction dicts from _message_reactions
+        download_media: Whether media is being downloaded
+        media_on_disk: Whether the stored media file exists
+
+    Returns:
+        bool: True if saving the message would change nothing
+    """
+    if (existing.get('views') != message.views or
+            existing.get('forwards') != message.forwards or
+            existing.get('reactions') != reactions):
+        return False
+    if not download_media:
+        return True
+    if message.media:
+        # Media already on disk is kept; otherwise it would be downloaded
+        return media_on_disk
+    return existing.get('media_file_path') is None
+
+def _prepare_batch(batch_messages, channel_msgs, now_str, filter_word_normalized,
+                   download_media, download_photos, download_videos, force_redownload):
+    """
+    Filter a batch of messages and build the dicts of those that changed
+
+    Does no awaiting, so save_channel_messages runs it in a worker thread
+    while the event loop keeps fetching the next batch.
+
+    Args:
+        batch_messages: Telethon messages of the batch
+        channel_msgs: Stored message dicts of the channel, only read here
+        now_str: Timestamp string for last_update
+        filter_word_normalized: Lowercase filter word, or None
+        download_media: Whether media is being downloaded
+        download_photos: Whether photos are downloaded
+        download_videos: Whether videos are downloaded
+        force_redownload: Whether to store and download messages again
+
+    Returns:
+        tuple: (pending, media_jobs, counts) where pending holds (msg_id, message_dict)
+            pairs to store, media_jobs the downloads to run and counts the skipped
+            and error counters
+    """
+    pending = []
+    media_jobs = []
+    counts = {'skipped_by_filter': 0, 'skipped': 0, 'media_skipped': 0, 'media_errors': 0, 'errors': 0}
+    for message in batch_messages:
+        try:
+            if filter_word_normalized:
+                # Check text and raw_text separately, without joining them first
+                text = message.text
+                raw_text = message.raw_text
+                if not ((text and filter_word_normalized in text.lower()) or
+                        (raw_text and raw_text is not text and filter_word_normalized in raw_text.lower())):
+                    counts['skipped_by_filter'] += 1
+                    continue
+
+            msg_id = str(message.id)
+            reactions = _message_reactions(message)
+
+            # Skip unchanged messages before building their dict or touching media
+            existing = channel_msgs.get(msg_id)
+            existing_media_path = existing.get('media_file_path') if existing else None
+            # One stat per message, shared by the unchanged check and the media step
+            media_on_disk = bool(
+                download_media and message.media and existing_media_path
+                and os.path.exists(existing_media_path)
+            )
+            if (existing and not force_redownload and
+                    _is_unchanged(existing, message, reactions, download_media, media_on_disk)):
+                if download_media and message.media:
+                    counts['media_skipped'] += 1
+                counts['skipped'] += 1
+                continue
+
+            message_dict = _build_message_dict(message, reactions, now_str)
+
+            # Queue media download if requested and message has media
+            if download_media and message.media:
+                is_photo = bool(message.photo) or isinstance(message.media, types.MessageMediaPhoto)
+                mime_type = ''
+                has_video_attribute = False
+                # Looked up once; DocumentEmpty lacks the fields read below
+                doc = getattr(message.media, 'document', None)
+                if doc:
+                    mime_type = getattr(doc, 'mime_type', '') or ''
+                    has_video_attribute = any(
+                        isinstance(attr, types.DocumentAttributeVideo)
+                        for attr in getattr(doc, 'attributes', [])
+                    )
+                is_video = (mime_type.startswith('video/') or has_video_attribute)
+
+                # Skip based on media type preferences
+                if (is_photo and not download_photos) or (is_video and not download_videos):
+                    if VERBOSE:
+                        print(f"Skipping media for message #{message.id}: downloads disabled for {'photos' if is_photo else 'videos'}")
+                    if existing_media_path:
+                        message_dict['media_file_path'] = existing_media_path
+                    counts['media_skipped'] += 1
+                else:
+                    try:
+                        # Check if we already have the media downloaded
+                        if not media_on_disk or force_redownload:
+
+                            # Create a filename based on message ID and date
+                            filename = f"media_{message.id}_{message.date.strftime('%Y%m%d_%H%M%S')}"
+
+                            # Get media file size if available
+                            file_size = getattr(doc, 'size', None)
+
+                            media_jobs.append((message, message_dict, msg_id, is_video, mime_type, filename, file_size))
+                        else:
+                            # Media already downloaded
+                            message_dict['media_file_path'] = existing_media_path
+                            if VERBOSE:
+                                print(f"Media for message #{message.id} already downloaded, skipping...")
+                            counts['media_skipped'] += 1
+
+                    except Exception as media_error:
+                        print(f"Error downloading media from message #{message.id}: {str(media_error)}")
+                        logger.error(f"Error downloading media: {str(media_error)}")
+                        counts['media_errors'] += 1
+
+            pending.append((msg_id, message_dict))
+
+        except Exception as msg_error:
+            logger.error(f"Error processing message {message.id}: {str(msg_error)}")
+            counts['errors'] += 1
+            continue
+    return pending, media_jobs, counts
+
 async def save_channel_messages(client, db, db_path, limit=None, force_redownload=False, 
                               min_id=None, max_id=None, recent_count=None,
                               download_media=True, filter_word=None,
@@ -58,21 +309,20 @@ async def save_channel_messages(client, db, db_path, limit=None, force_redownloa
             db['messages'] = {}
         if channel_id not in db['messages']:
             db['messages'][channel_id] = {}
+        channel_msgs = db['messages'][channel_id]
+        channel_videos = None
         
         # Get channel message boundaries
         print("\nAnalyzing channel messages...")
-        first_message = None
-        last_message = None
-        
-        # Get first message (oldest)
-        async for msg in client.iter_messages(active['id'], limit=1, reverse=True):
-            first_message = msg
-            print(f"First message found: #{msg.id} ({msg.date})")
-        
-        # Get last message (newest) 
-        async for msg in client.iter_messages(active['id'], limit=1):
-            last_message = msg
-            print(f"Last message found: #{msg.id} ({msg.date})")
+        # Get first (oldest) and last (newest) message with both requests in flight at once
+        first_message, last_message = await asyncio.gather(
+            _boundary_message(client, active['id'], reverse=True),
+            _boundary_message(client, active['id'], reverse=False)
+        )
+        if first_message:
+            print(f"First message found: #{first_message.id} ({first_message.date})")
+        if last_message:
+            print(f"Last message found: #{last_message.id} ({last_message.date})")
             
         if not first_message or not last_message:
             print("\nNo messages found in channel!")
@@ -138,247 +388,214 @@ async def save_channel_messages(client, db, db_path, limit=None, force_redownloa
         
         # Progress tracking
         start_time = datetime.now()
-        last_save_time = start_time
+        last_progress = 0.0
         
-        # Process messages in batches from newest to oldest
-        current_id = fetch_max_id - 1
+        # Media downloads run concurrently, but their starts stay at least
+        # MEDIA_DOWNLOAD_DELAY seconds apart to avoid rate limits
+        semaphore = asyncio.Semaphore(MEDIA_DOWNLOAD_CONCURRENCY)
+        start_lock = asyncio.Lock()
+        next_start = 0.0
         
-        while current_id >= fetch_min_id and (limit is None or processed < limit):
-            try:
-                # Check if we need to adjust batch size to respect limits
-                remaining = limit - processed if limit is not None else None
-                batch_size = min(MESSAGES_BATCH_SIZE, remaining) if remaining is not None else MESSAGES_BATCH_SIZE
-                
-                print(f"\nFetching batch for messages <= {current_id}")
-                print(f"Batch parameters:")
-                print(f"- Channel ID: {active['id']}")
-                print(f"- Limit: {batch_size}")
-                print(f"- Min ID: {fetch_min_id}")
-                print(f"- Max ID: {current_id + 1}")
+        async def fetch_media(message, filename, file_size):
+            nonlocal next_start
+            async with semaphore:
+                async with start_lock:
+                    delay = next_start - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    next_start = time.monotonic() + MEDIA_DOWNLOAD_DELAY
                 
-                # Get batch of messages with Telegram's limit of 100 per request
-                batch_messages = []
-                async for message in client.iter_messages(
-                    active['id'],
-                    limit=batch_size,
-                    max_id=current_id + 1,
-                    min_id=fetch_min_id - 1  # -1 to include the min_id message
-                ):
-                    batch_messages.append(message)
-                    processed += 1
-                    if limit is not None and processed >= limit:
+                if VERBOSE:
+                    print(f"Downloading media from message #{message.id}...")
+                    if file_size:
+                        print(f"Media size: {file_size / (1024 * 1024):.2f} MB")
+                return await download_media_safely(
+                    client=client,
+                    message=message,
+                    filename=filename,
+                    file_size=file_size
+                )
+        
+        # Batches are fetched from newest to oldest while the previous one
+        # is processed; the bounded queue keeps at most two batches ahead
+        queue = asyncio.Queue(maxsize=2)
+        
+        async def fetch_batches():
+            nonlocal processed, retry_count
+            current_id = fetch_max_id - 1
+            
+            while current_id >= fetch_min_id and (limit is None or processed < limit):
+                try:
+                    # Check if we need to adjust batch size to respect limits
+                    remaining = limit - processed if limit is not None else None
+                    batch_size = min(MESSAGES_BATCH_SIZE, remaining) if remaining is not None else MESSAGES_BATCH_SIZE
+                    
+                    if VERBOSE:
+                        print(f"\nFetching batch for messages <= {current_id}")
+                        print(f"Batch parameters:")
+                        print(f"- Channel ID: {active['id']}")
+                        print(f"- Limit: {batch_size}")
+                        print(f"- Min ID: {fetch_min_id}")
+                        print(f"- Max ID: {current_id + 1}")
+                    
+                    # Get batch of messages with Telegram's limit of 100 per request
+                    batch_messages = []
+                    async for message in client.iter_messages(
+                        active['id'],
+                        limit=batch_size,
+                        max_id=current_id + 1,
+                        min_id=fetch_min_id - 1  # -1 to include the min_id message
+                    ):
+                        batch_messages.append(message)
+                        processed += 1
+                        if limit is not None and processed >= limit:
+                            break
+                    
+                    if VERBOSE:
+                        print(f"Retrieved {len(batch_messages)} messages in batch")
+                        if batch_messages:
+                            print(f"First message in batch: #{batch_messages[0].id}")
+                            print(f"Last message in batch: #{batch_messages[-1].id}")
+                    
+                    if not batch_messages:
+                        print("\nNo more messages in batch, breaking loop")
                         break
+                    
+                    # Update current_id for next batch; messages come newest first,
+                    # so the last one has the lowest ID
+                    current_id = batch_messages[-1].id - 1
+                    if VERBOSE:
+                        print(f"Next batch will start from ID: {current_id}")
+                    
+                    await queue.put((batch_messages, current_id))
+                    
+                    # Add delay to respect rate limits
+                    if len(batch_messages) == MESSAGES_BATCH_SIZE:
+                        if VERBOSE:
+                            print(f"Waiting {BATCH_DELAY} seconds before next batch to respect rate limits...")
+                        await asyncio.sleep(BATCH_DELAY)
+                    
+                except Exception as batch_error:
+                    print(f"\nDebug: Batch fetch error details:")
+                    print(f"- Error type: {type(batch_error).__name__}")
+                    print(f"- Error message: {str(batch_error)}")
+                    print(f"- Current message ID: {current_id}")
+                    logger.error(f"Error fetching batch: {str(batch_error)}", exc_info=True)
+                    
+                    retry_count += 1
+                    if retry_count >= MAX_RETRIES:
+                        print(f"\nToo many errors, stopping download at message {current_id}")
+                        break
+                    print(f"\nRetrying batch in {BATCH_DELAY * 2} seconds... ({retry_count}/{MAX_RETRIES})")
+                    await asyncio.sleep(BATCH_DELAY * 2)
+            
+            # Tell the processing loop that there are no more batches
+            await queue.put(None)
+        
+        fetcher = asyncio.create_task(fetch_batches())
+        
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                break
+            batch_messages, current_id = batch
+            
+            try:
+                # Process batch: build message dicts first, then download
+                # their media concurrently, then store them. The dicts are
+                # built off the event loop so fetching continues meanwhile
+                pending, media_jobs, counts = await asyncio.to_thread(
+                    _prepare_batch, batch_messages, channel_msgs,
+                    datetime.now().isoformat(sep=' '), filter_word_normalized,
+                    download_media, download_photos, download_videos, force_redownload
+                )
+                skipped_by_filter += counts['skipped_by_filter']
+                skipped += counts['skipped']
+                media_skipped += counts['media_skipped']
+                media_errors += counts['media_errors']
+                errors += counts['errors']
                 
-                print(f"Retrieved {len(batch_messages)} messages in batch")
-                if batch_messages:
-                    print(f"First message in batch: #{batch_messages[0].id}")
-                    print(f"Last message in batch: #{batch_messages[-1].id}")
-                
-                if not batch_messages:
-                    print("\nNo more messages in batch, breaking loop")
-                    break
-                
-                # Update current_id for next batch
-                current_id = min(msg.id for msg in batch_messages) - 1
-                print(f"Next batch will start from ID: {current_id}")
-                
-                # Add delay to respect rate limits
-                if len(batch_messages) == MESSAGES_BATCH_SIZE:
-                    print(f"Waiting {BATCH_DELAY} seconds before next batch to respect rate limits...")
-                    await asyncio.sleep(BATCH_DELAY)
-                
-                # Process batch
-                for message in batch_messages:
-                    try:
-                        if filter_word_normalized:
-                            combined_text = f"{message.text or ''}\n{message.raw_text or ''}".lower()
-                            if filter_word_normalized not in combined_text:
-                                skipped_by_filter += 1
-                                continue
-
-                        # Create message dict with all available fields
-                        message_dict = {
-                            'id': message.id,
-                            'date': str(message.date),
-                            'edit_date': str(message.edit_date) if message.edit_date else None,
-                            'from_id': message.from_id.user_id if message.from_id else None,
-                            'post_author': getattr(message, 'post_author', None),  # Get channel post author
-                            'text': message.text,
-                            'raw_text': message.raw_text,
-                            'entities': entities_to_dicts(message.entities),  # Store native Telegram entities
-                            'text_html': getattr(message, 'text_html', message.text),  # Get HTML representation
-                            'out': message.out,
-                            'mentioned': message.mentioned,
-                            'media_unread': message.media_unread,
-                            'silent': message.silent,
-                            'post': message.post,
-                            'from_scheduled': message.from_scheduled,
-                            'legacy': message.legacy,
-                            'edit_hide': message.edit_hide,
-                            'pinned': message.pinned,
-                            'noforwards': message.noforwards,
-                            'views': getattr(message, 'views', 0),
-                            'forwards': getattr(message, 'forwards', 0),
-                            'has_media': bool(message.media),
-                            'media_type': type(message.media).__name__ if message.media else None,
-                            'media_file_path': None,  # Will store path to downloaded media
-                            'grouped_id': str(message.grouped_id) if message.grouped_id else None,
-                            'reactions': [],
-                            'reply_to': message.reply_to.reply_to_msg_id if message.reply_to else None,
-                            'last_update': str(datetime.now())
-                        }
-                        
-                        # Add reactions if present
-                        if hasattr(message, 'reactions') and message.reactions:
-                            try:
-                                for reaction in message.reactions.results:
-                                    reaction_data = {
-                                        'emoticon': reaction.reaction.emoticon if hasattr(reaction.reaction, 'emoticon') else None,
-                                        'document_id': reaction.reaction.document_id if hasattr(reaction.reaction, 'document_id') else None,
-                                        'count': reaction.count,
-                                        # Only add chosen if it exists
-                                        'chosen': getattr(reaction, 'chosen', False)
-                                    }
-                                    message_dict['reactions'].append(reaction_data)
-                            except Exception as reaction_error:
-                                logger.debug(f"Could not process reactions for message {message.id}: {str(reaction_error)}")
-                                # Add basic reaction info without chosen status
-                                for reaction in message.reactions.results:
-                                    try:
-                                        reaction_data = {
-                                            'emoticon': reaction.reaction.emoticon if hasattr(reaction.reaction, 'emoticon') else None,
-                                            'document_id': reaction.reaction.document_id if hasattr(reaction.reaction, 'document_id') else None,
-                                            'count': reaction.count
-                                        }
-                                        message_dict['reactions'].append(reaction_data)
-                                    except Exception as e:
-                                        logger.debug(f"Skipping malformed reaction in message {message.id}: {str(e)}")
-                                        continue
-                        
-                        msg_id = str(message.id)
-                        
-                        # Download media if requested and message has media
-                        if download_media and message.media:
-                            is_photo = bool(getattr(message, 'photo', None)) or isinstance(message.media, types.MessageMediaPhoto)
-                            mime_type = ''
-                            has_video_attribute = False
-                            if hasattr(message.media, 'document') and message.media.document:
-                                mime_type = getattr(message.media.document, 'mime_type', '') or ''
-                                has_video_attribute = any(
-                                    isinstance(attr, types.DocumentAttributeVideo)
-                                    for attr in getattr(message.media.document, 'attributes', [])
-                                )
-                            is_video = (mime_type.startswith('video/') or has_video_attribute)
-
-                            # Skip based on media type preferences
-                            if (is_photo and not download_photos) or (is_video and not download_videos):
-                                print(f"Skipping media for message #{message.id}: downloads disabled for {'photos' if is_photo else 'videos'}")
-                                if msg_id in db['messages'][channel_id]:
-                                    existing_media_path = db['messages'][channel_id][msg_id].get('media_file_path')
-                                    if existing_media_path:
-                                        message_dict['media_file_path'] = existing_media_path
-                                media_skipped += 1
-                            else:
-                                try:
-                                    # Check if we already have the media downloaded
-                                    existing_media_path = None
-                                    if msg_id in db['messages'][channel_id]:
-                                        existing_media_path = db['messages'][channel_id][msg_id].get('media_file_path')
-                                    
-                                    if (not existing_media_path or 
-                                        not os.path.exists(existing_media_path) or 
-                                        force_redownload):
-                                        
-                                        # Create a filename based on message ID and date
-                                        filename = f"media_{message.id}_{message.date.strftime('%Y%m%d_%H%M%S')}"
-                                        
-                                        # Download the media
-                                        print(f"Downloading media from message #{message.id}...")
-                                        
-                                        # Get media file size if available
-                                        file_size = None
-                                        if hasattr(message.media, 'document'):
-                                            file_size = getattr(message.media.document, 'size', None)
-                                            if file_size:
-                                                size_mb = file_size / (1024 * 1024)
-                                                print(f"Media size: {size_mb:.2f} MB")
-                                        
-                                        # Use our enhanced download method
-                                        download_result = await download_media_safely(
-                                            client=client,
-                                            message=message,
-                                            filename=filename,
-                                            file_size=file_size
-                                        )
-                                        
-                                        if download_result['success']:
-                                            file_path = download_result['file_path']
-                                            print(f"Media saved to: {file_path}")
-                                            # Update message dict with media path
-                                            message_dict['media_file_path'] = file_path
-                                            media_downloaded += 1
-                                            
-                                            # Also store in videos database if it's a video
-                                            if is_video:
-                                                # Initialize videos dict if needed
-                                                if 'videos' not in db:
-                                                    db['videos'] = {}
-                                                if channel_id not in db['videos']:
-                                                    db['videos'][channel_id] = {}
-                                                    
-                                                # Add video information
-                                                video_info = {
-                                                    'id': message.id,
-                                                    'date': str(message.date),
-                                                    'from_id': message_dict['from_id'],
-                                                    'media_type': message_dict['media_type'],
-                                                    'file_path': file_path,
-                                                    'download_date': str(datetime.now()),
-                                                    'file_size': os.path.getsize(file_path) if os.path.exists(file_path) else None,
-                                                    'duration': getattr(message.media.document, 'duration', None) if hasattr(message.media, 'document') else None,
-                                                    'mime_type': mime_type,
-                                                    'size': getattr(message.media.document, 'size', None) if hasattr(message.media, 'document') else None,
-                                                }
-                                                db['videos'][channel_id][msg_id] = video_info
-                                        else:
-                                            # Handle download failure
-                                            print(f"Failed to download media: {download_result['error']}")
-                                            logger.warning(f"Media download failed for message {message.id}: {download_result['error']}")
-                                            media_errors += 1
-                                        
-                                        # Add delay between media downloads to avoid rate limits
-                                        await asyncio.sleep(MEDIA_DOWNLOAD_DELAY)
-                                    else:
-                                        # Media already downloaded
-                                        message_dict['media_file_path'] = existing_media_path
-                                        print(f"Media for message #{message.id} already downloaded, skipping...")
-                                        media_skipped += 1
-                                        
-                                except Exception as media_error:
-                                    print(f"Error downloading media from message #{message.id}: {str(media_error)}")
-                                    logger.error(f"Error downloading media: {str(media_error)}")
-                                    media_errors += 1
+                # Download the queued media concurrently
+                results = await asyncio.gather(
+                    *(fetch_media(message, filename, file_size)
+                      for message, _, _, _, _, filename, file_size in media_jobs),
+                    return_exceptions=True
+                )
+                downloaded_at = datetime.now().isoformat(sep=' ')
+                new_videos = {}
+                for (message, message_dict, msg_id, is_video, mime_type, _, _), download_result in zip(media_jobs, results):
+                    if isinstance(download_result, Exception):
+                        print(f"Error downloading media from message #{message.id}: {str(download_result)}")
+                        logger.error(f"Error downloading media: {str(download_result)}")
+                        media_errors += 1
+                    elif download_result['success']:
+                        file_path = download_result['file_path']
+                        if VERBOSE:
+                            print(f"Media saved to: {file_path}")
+                        # Update message dict with media path
+                        message_dict['media_file_path'] = file_path
+                        media_downloaded += 1
                         
-                        if msg_id in db['messages'][channel_id] and not force_redownload:
-                            # Check if message needs update
-                            existing = db['messages'][channel_id][msg_id]
-                            if (existing.get('views') != message_dict['views'] or 
-                                existing.get('forwards') != message_dict['forwards'] or
-                                existing.get('reactions') != message_dict['reactions'] or
-                                (download_media and existing.get('media_file_path') != message_dict['media_file_path'])):
-                                db['messages'][channel_id][msg_id].update(message_dict)
-                                updated += 1
-                            else:
-                                skipped += 1
+                        # Also store in videos database if it's a video
+                        if is_video:
+                            # Initialize videos dict if needed
+                            if channel_videos is None:
+                                if 'videos' not in db:
+                                    db['videos'] = {}
+                                if channel_id not in db['videos']:
+                                    db['videos'][channel_id] = {}
+                                channel_videos = db['videos'][channel_id]
+                                
+                            # Add video information
+                            doc = getattr(message.media, 'document', None)
+                            video_info = {
+                                'id': message.id,
+                                'date': str(message.date),
+                                'from_id': message_dict['from_id'],
+                                'media_type': message_dict['media_type'],
+                                'file_path': file_path,
+                                'download_date': downloaded_at,
+                                'file_size': _file_size(file_path),
+                                'duration': getattr(doc, 'duration', None),
+                                'mime_type': mime_type,
+                                'size': getattr(doc, 'size', None),
+                            }
+                            channel_videos[msg_id] = video_info
+                            new_videos[msg_id] = video_info
+                    else:
+                        # Handle download failure
+                        print(f"Failed to download media: {download_result['error']}")
+                        logger.warning(f"Media download failed for message {message.id}: {download_result['error']}")
+                        media_errors += 1
+                
+                # Store the processed messages
+                changed = {}
+                for msg_id, message_dict in pending:
+                    existing = channel_msgs.get(msg_id)
+                    if existing is not None and not force_redownload:
+                        # Check if message needs update
+                        if (existing.get('views') != message_dict['views'] or 
+                            existing.get('forwards') != message_dict['forwards'] or
+                            existing.get('reactions') != message_dict['reactions'] or
+                            (download_media and existing.get('media_file_path') != message_dict['media_file_path'])):
+                            existing.update(message_dict)
+                            changed[msg_id] = existing
+                            updated += 1
                         else:
-                            # Add new message or force update
-                            db['messages'][channel_id][msg_id] = message_dict
-                            saved += 1
-                        
-                    except Exception as msg_error:
-                        logger.error(f"Error processing message {message.id}: {str(msg_error)}")
-                        errors += 1
-                        continue
+                            skipped += 1
+                    else:
+                        # Add new message or force update
+                        channel_msgs[msg_id] = message_dict
+                        changed[msg_id] = message_dict
+                        saved += 1
+                
+                # Write only what this batch changed
+                if changed:
+                    await asyncio.to_thread(save_channel_items, db_path, 'messages', channel_id, changed)
+                    _search_index_cache.pop(channel_id, None)
+                    _browse_order_cache.pop(channel_id, None)
+                if new_videos:
+                    await asyncio.to_thread(save_channel_items, db_path, 'videos', channel_id, new_videos)
                 
                 # Update progress
                 current_time = datetime.now()
@@ -386,21 +603,22 @@ async def save_channel_messages(client, db, db_path, limit=None, force_redownloa
                 completed = saved + updated + skipped + skipped_by_filter
                 speed = completed / elapsed.total_seconds() if elapsed.total_seconds() > 0 else 0
                 
-                # Save database periodically
-                if (current_time - last_save_time).total_seconds() > SAVE_INTERVAL:
-                    save_database(db_path, db)
-                    last_save_time = current_time
-                
-                # Update display
-                print("\033[F\033[K" * 8)
-                print(f"Progress: {completed}/{total} messages ({current_time - start_time})")
-                print(f"New: {saved} | Updated: {updated} | Skipped (unchanged): {skipped}")
-                print(f"Skipped by filter: {skipped_by_filter} | Errors: {errors}")
-                print(f"Speed: {speed:.1f} messages/second")
-                print(f"Elapsed: {str(elapsed).split('.')[0]}")
-                print(f"Current Batch: {len(batch_messages)} messages (ID: {current_id})")
-                print(f"Retries: {retry_count}/{MAX_RETRIES}")
-                print("-"*50)
+                # Update display with a single write, at most once per refresh interval
+                now = time.monotonic()
+                if now - last_progress >= PROGRESS_REFRESH_INTERVAL:
+                    last_progress = now
+                    sys.stdout.write(
+                        "\033[F\033[K" * 8 + "\n"
+                        f"Progress: {completed}/{total} messages ({current_time - start_time})\n"
+                        f"New: {saved} | Updated: {updated} | Skipped (unchanged): {skipped}\n"
+                        f"Skipped by filter: {skipped_by_filter} | Errors: {errors}\n"
+                        f"Speed: {speed:.1f} messages/second\n"
+                        f"Elapsed: {str(elapsed).split('.')[0]}\n"
+                        f"Current Batch: {len(batch_messages)} messages (ID: {current_id})\n"
+                        f"Retries: {retry_count}/{MAX_RETRIES}\n"
+                        + "-"*50 + "\n"
+                    )
+                    sys.stdout.flush()
                 
                 # Reset retry count on successful batch
                 retry_count = 0
@@ -416,12 +634,10 @@ async def save_channel_messages(client, db, db_path, limit=None, force_redownloa
                 retry_count += 1
                 if retry_count >= MAX_RETRIES:
                     print(f"\nToo many errors, stopping download at message {current_id}")
+                    fetcher.cancel()
                     break
-                print(f"\nRetrying batch in {BATCH_DELAY * 2} seconds... ({retry_count}/{MAX_RETRIES})")
-                await asyncio.sleep(BATCH_DELAY * 2)
         
-        # Final save
-        save_database(db_path, db)
+        await asyncio.gather(fetcher, return_exceptions=True)
         
         # Final statistics
         end_time = datetime.now()
@@ -455,6 +671,46 @@ async def save_channel_messages(client, db, db_path, limit=None, force_redownloa
         print(f"\nError saving messages: {str(e)}")
         return False
 
+def get_message_index(channel_id, messages):
+    """
+    Sort a channel's messages by date and group them by sender, media and reactions
+
+    Built once and reused by later searches and per-user exports until
+    the channel's messages change.
+
+    Args:
+        channel_id: Channel ID string
+        messages: Message dict of the channel
+
+    Returns:
+        dict: 'by_date' list, 'by_user' (from_id string -> messages),
+            'with_media' and 'with_reactions' lists, all sorted by date
+    """
+    signature = (id(messages), len(messages))
+    cached = _search_index_cache.get(channel_id)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    by_date = sorted(messages.values(), key=lambda x: x.get('date') or '')
+    by_user = {}
+    with_media = []
+    with_reactions = []
+    for msg in by_date:
+        from_id = msg.get('from_id')
+        if from_id is not None:
+            by_user.setdefault(str(from_id), []).append(msg)
+        if msg.get('has_media'):
+            with_media.append(msg)
+        if msg.get('reactions'):
+            with_reactions.append(msg)
+
+    index = {
+        'by_date': by_date, 'by_user': by_user,
+        'with_media': with_media, 'with_reactions': with_reactions
+    }
+    _search_index_cache[channel_id] = (signature, index)
+    return index
+
 async def search_messages(db):
     """
     Search in saved messages
@@ -492,7 +748,7 @@ async def search_messages(db):
         query = input("\nEnter search text: ").lower()
         results = []
         
-        for msg_id, msg in messages.items():
+        for msg in get_message_index(channel_id, messages)['by_date']:
             if msg.get('text') and query in msg['text'].lower():
                 results.append(msg)
                 
@@ -506,11 +762,14 @@ async def search_messages(db):
             from_dt = datetime.strptime(from_date, '%Y-%m-%d')
             to_dt = datetime.strptime(to_date, '%Y-%m-%d')
             
-            results = []
-            for msg_id, msg in messages.items():
-                msg_date = datetime.strptime(msg['date'].split('+')[0], '%Y-%m-%d %H:%M:%S')
-                if from_dt <= msg_date <= to_dt:
-                    results.append(msg)
+            # Stored dates start with a fixed-width 'YYYY-MM-DD HH:MM:SS' in UTC,
+            # so comparing that prefix as a string orders them like datetimes
+            from_str = from_dt.strftime('%Y-%m-%d %H:%M:%S')
+            to_str = to_dt.strftime('%Y-%m-%d %H:%M:%S')
+            results = [
+                msg for msg in get_message_index(channel_id, messages)['by_date']
+                if from_str <= msg['date'][:19] <= to_str
+            ]
                     
             _display_message_results(results, f"Messages from {from_date} to {to_date}")
             
@@ -525,19 +784,11 @@ async def search_messages(db):
             print("\nMessage not found!")
             
     elif choice == '4':
-        results = []
-        for msg_id, msg in messages.items():
-            if msg.get('reactions') and len(msg['reactions']) > 0:
-                results.append(msg)
-                
+        results = list(get_message_index(channel_id, messages)['with_reactions'])
         _display_message_results(results, "Messages with reactions")
         
     elif choice == '5':
-        results = []
-        for msg_id, msg in messages.items():
-            if msg.get('has_media'):
-                results.append(msg)
-                
+        results = list(get_message_index(channel_id, messages)['with_media'])
         _display_message_results(results, "Messages with media")
         
     elif choice == '6':
@@ -577,15 +828,8 @@ async def search_messages(db):
             return
         
         # Find user's messages
-        user_messages = []
         target_user_id_str = str(target_user_id)  # Convert to string for comparison
-        for msg_id, msg in messages.items():
-            # Check both from_id and sender_id (for compatibility)
-            msg_from_id = msg.get('from_id')
-            if msg_from_id is not None:
-                msg_from_id_str = str(msg_from_id)  # Convert to string
-                if msg_from_id_str == target_user_id_str:
-                    user_messages.append(msg)
+        user_messages = list(get_message_index(channel_id, messages)['by_user'].get(target_user_id_str, []))
         
         if not user_messages:
             user = users[target_user_id]
@@ -603,6 +847,7 @@ async def search_messages(db):
         # Sort by date (newest first) and take last 10
         user_messages.sort(key=lambda x: x['date'], reverse=True)
         last_messages = user_messages[:10]
+        last_messages.sort(key=lambda x: x['date'])
         
         # Display results
         user = users[target_user_id]
@@ -644,46 +889,150 @@ def _display_message_results(messages, title):
     Helper method to display message search results
     
     Args:
-        messages: List of messages to display
+        messages: List of messages to display, sorted by date
         title: Title to display
     """
     if not messages:
         print("\nNo messages found!")
         return
         
-    print(f"\n{title}")
-    print(f"Found {len(messages)} messages")
-    print("-" * 80)
-    
-    # Sort messages by date
-    messages.sort(key=lambda x: x['date'])
+    # Collect all lines and write them at once; results can run to thousands
+    lines = [f"\n{title}", f"Found {len(messages)} messages", "-" * 80]
     
     for msg in messages:
-        print(f"\nMessage #{msg['id']} ({msg['date']})")
-        print(f"{'='*40}")
+        lines.append(f"\nMessage #{msg['id']} ({msg['date']})")
+        lines.append(f"{'='*40}")
         
         if msg.get('text'):
-            print(f"Text: {msg['text'][:200]}{'...' if len(msg['text']) > 200 else ''}")
+            lines.append(f"Text: {msg['text'][:200]}{'...' if len(msg['text']) > 200 else ''}")
         
         if msg.get('has_media'):
-            print(f"Media: {msg['media_type']}")
+            lines.append(f"Media: {msg['media_type']}")
         
         if msg.get('reactions'):
             reactions = []
             for reaction in msg['reactions']:
                 emoji = reaction.get('emoticon') or f"Custom({reaction.get('document_id')})"
                 reactions.append(f"{emoji}({reaction['count']})")
-            print(f"Reactions: {' '.join(reactions)}")
+            lines.append(f"Reactions: {' '.join(reactions)}")
         
         if msg.get('views'):
-            print(f"Views: {msg['views']}")
+            lines.append(f"Views: {msg['views']}")
         
         if msg.get('forwards'):
-            print(f"Forwards: {msg['forwards']}")
+            lines.append(f"Forwards: {msg['forwards']}")
         
-        print("-" * 80)
+        lines.append("-" * 80)
     
-    print(f"\nTotal results: {len(messages)}")
+    lines.append(f"\nTotal results: {len(messages)}")
+    sys.stdout.write("\n".join(lines) + "\n")
+
+def _sorted_message_ids(channel_id, messages):
+    """
+    Get a channel's message IDs in ascending order for paging
+
+    Sorts the integer IDs rather than the message dicts, and reuses the
+    result until the channel's messages change.
+
+    Args:
+        channel_id: Channel ID string
+        messages: Message dict of the channel
+
+    Returns:
+        list: Message IDs as integers
+    """
+    signature = (id(messages), len(messages))
+    cached = _browse_order_cache.get(channel_id)
+    if cached and cached[0] == signature:
+        return cached[1]
+    ids = sorted(map(int, messages))
+    _browse_order_cache[channel_id] = (signature, ids)
+    return ids
+
+@functools.lru_cache(maxsize=None)
+def _ansi_supported():
+    """
+    Check once whether the console understands ANSI escape sequences
+
+    Enables virtual terminal processing on the Windows console, which
+    Windows 10 and later support.
+
+    Returns:
+        bool: True if escape sequences can be written to stdout
+    """
+    if os.name != 'nt':
+        return True
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)  # STD_OUTPUT_HANDLE
+        mode = ctypes.c_uint32()
+        if not kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            return False
+        # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+        return bool(kernel32.SetConsoleMode(handle, mode.value | 0x0004))
+    except (AttributeError, OSError):
+        return False
+
+def _clear_screen():
+    """Clear the terminal without starting a clear/cls subprocess when possible"""
+    if _ansi_supported():
+        sys.stdout.write("\033[H\033[2J\033[3J")
+        sys.stdout.flush()
+    else:
+        os.system('cls' if os.name == 'nt' else 'clear')
+
+def _display_width(line):
+    """
+    Estimate how many terminal columns a line takes
+
+    Wide characters such as CJK or emoji count as two columns, so the
+    estimate errs on the side of a line wrapping.
+
+    Args:
+        line: Text without newlines
+
+    Returns:
+        int: Number of columns
+    """
+    if line.isascii():
+        return len(line)
+    return len(line) + sum(1 for ch in line if unicodedata.east_asian_width(ch) in 'WF')
+
+def _redraw(frame, prev_frame):
+    """
+    Draw a browse page, rewriting only the lines that changed
+
+    Clears the screen and draws everything when nothing is on screen yet,
+    output is not a terminal, the terminal is too short to address every
+    line of the page along with the prompts printed below it, or too
+    narrow for a line, which would wrap onto the next screen row.
+
+    Args:
+        frame: Lines of the page to show
+        prev_frame: Lines currently on screen, or None
+
+    Returns:
+        list: The frame, to pass as prev_frame next time
+    """
+    size = shutil.get_terminal_size()
+    # Up to 8 lines of prompts and messages follow the page before the next redraw
+    if (prev_frame is None or not _ansi_supported() or not sys.stdout.isatty()
+            or len(frame) + 8 > size.lines
+            or any(_display_width(line) > size.columns for line in frame)):
+        _clear_screen()
+        sys.stdout.write("\n".join(frame) + "\n")
+    else:
+        buf = [
+            f"\033[{i + 1};1H\033[2K{line}"
+            for i, line in enumerate(frame)
+            if i >= len(prev_frame) or line != prev_frame[i]
+        ]
+        # Clear the previous prompt and anything else below the page
+        buf.append(f"\033[{len(frame) + 1};1H\033[J")
+        sys.stdout.write("".join(buf))
+    sys.stdout.flush()
+    return frame
 
 async def browse_messages(db):
     """
@@ -707,72 +1056,105 @@ async def browse_messages(db):
         print("\nNo messages found!")
         return
     
-    # Convert messages dictionary to list and sort by ID
-    message_list = [msg for msg_id, msg in messages.items()]
-    message_list.sort(key=lambda x: int(x['id']))
+    # Only the IDs are sorted; each page looks up its own messages
+    message_ids = _sorted_message_ids(channel_id, messages)
     
-    page_size = 10  # Number of messages per page
+    page_size = BROWSE_PAGE_SIZE
     current_page = 0
-    total_pages = (len(message_list) + page_size - 1) // page_size
+    total_pages = (len(message_ids) + page_size - 1) // page_size
+    
+    # Sender labels by (post_author, from_id); the same senders recur across pages
+    from_cache = {}
+    channel_users = db.get('users', {}).get(channel_id, {})
+    channel_title = active['title']
+    is_channel = active['type'] == 'Channel'
+    
+    def resolve_from(from_id, post_author):
+        key = (post_author, from_id)
+        from_text = from_cache.get(key)
+        if from_text is not None:
+            return from_text
+        # Check for post_author first (for channel posts)
+        if post_author:
+            from_text = post_author
+        elif from_id and from_id != 'Unknown':
+            from_text = f"User_{from_id}"
+            user = channel_users.get(str(from_id))
+            if user is not None:
+                if user.get('username'):
+                    from_text = f"@{user['username']}"
+                else:
+                    from_text = f"{user.get('first_name', '')} {user.get('last_name', '')}".strip() or from_text
+        else:
+            if is_channel:
+                from_text = channel_title  # Use channel name for channel posts
+            else:
+                from_text = "Unknown sender"
+        from_cache[key] = from_text
+        return from_text
+    
+    # Formatted index rows by message ID
+    row_cache = {}
+    # Lines of the page on screen; None when other output replaced it
+    prev_frame = None
     
     while True:
-        os.system('cls' if os.name == 'nt' else 'clear')
         start_idx = current_page * page_size
-        end_idx = min(start_idx + page_size, len(message_list))
-        current_messages = message_list[start_idx:end_idx]
+        end_idx = min(start_idx + page_size, len(message_ids))
+        frame = [
+            "",
+            f"Message Index for {channel_title} - Page {current_page + 1}/{total_pages}",
+            f"Total Messages: {len(message_ids)}",
+            "-" * 80,
+            f"{'ID':<10} | {'Date':<20} | {'From':<15} | {'Preview':<30}",
+            "-" * 80
+        ]
         
-        print(f"\nMessage Index for {active['title']} - Page {current_page + 1}/{total_pages}")
-        print(f"Total Messages: {len(message_list)}")
-        print("-" * 80)
-        print(f"{'ID':<10} | {'Date':<20} | {'From':<15} | {'Preview':<30}")
-        print("-" * 80)
-        
-        for msg in current_messages:
-            msg_id = msg['id']
-            date = msg['date'].split(' ')[0] if ' ' in msg.get('date', '') else msg.get('date', 'N/A')
-            
-            # Get sender info
-            from_id = msg.get('from_id', 'Unknown')
-            # Check for post_author first (for channel posts)
-            if msg.get('post_author'):
-                from_text = msg['post_author']
-            elif from_id and from_id != 'Unknown':
-                from_text = f"User_{from_id}"
-                if channel_id in db.get('users', {}) and str(from_id) in db.get('users', {}).get(channel_id, {}):
-                    user = db['users'][channel_id][str(from_id)]
-                    if user.get('username'):
-                        from_text = f"@{user['username']}"
-                    else:
-                        from_text = f"{user.get('first_name', '')} {user.get('last_name', '')}".strip() or from_text
-            else:
-                if active['type'] == 'Channel':
-                    from_text = active['title']  # Use channel name for channel posts
-                else:
-                    from_text = "Unknown sender"
-            
-            # Get preview text (first line or part of it)
-            preview = msg.get('text', '')
-            if preview:
-                preview = preview.split('\n')[0][:30]  # First line, max 30 chars
-                if len(preview) < len(msg.get('text', '')):
-                    preview += "..."
-            elif msg.get('has_media'):
-                preview = f"[{msg.get('media_type', 'Media')}]"
-            else:
-                preview = "[Empty message]"
+        for list_id in message_ids[start_idx:end_idx]:
+            # Each row is formatted once per browsing session
+            row = row_cache.get(list_id)
+            if row is None:
+                msg = messages[str(list_id)]
+                msg_id = msg['id']
+                date = msg['date'].partition(' ')[0] if ' ' in msg.get('date', '') else msg.get('date', 'N/A')
                 
-            print(f"{msg_id:<10} | {date:<20} | {from_text[:15]:<15} | {preview:<30}")
+                # Get sender info
+                from_text = resolve_from(msg.get('from_id', 'Unknown'), msg.get('post_author'))
+                
+                # Get preview text (first line or part of it)
+                preview = msg.get('text', '')
+                if preview:
+                    preview = preview.partition('\n')[0][:30]  # First line, max 30 chars
+                    if len(preview) < len(msg.get('text', '')):
+                        preview += "..."
+                elif msg.get('has_media'):
+                    preview = f"[{msg.get('media_type', 'Media')}]"
+                else:
+                    preview = "[Empty message]"
+                    
+                row = " | ".join((
+                    str(msg_id).ljust(10), date.ljust(20), from_text[:15].ljust(15), preview.ljust(30)
+                ))
+                row_cache[list_id] = row
+            frame.append(row)
         
-        print("-" * 80)
-        print("\nNavigation:")
-        print("n - Next page")
-        print("p - Previous page")
-        print("g - Go to page")
-        print("j - Jump to message ID")
-        print("v - View message HTML source")
-        print("q - Return to main menu")
+        frame += [
+            "-" * 80,
+            "",
+            "Navigation:",
+            "n - Next page",
+            "p - Previous page",
+            "g - Go to page",
+            "j - Jump to message ID",
+            "v - View message HTML source",
+            "q - Return to main menu"
+        ]
+        prev_frame = _redraw(frame, prev_frame)
         
         choice = input("\nEnter your choice: ").lower()
+        # Viewing a message replaces the screen; other choices only print below the page
+        if choice == 'v':
+            prev_frame = None
         
         if choice == 'n':
             if current_page < total_pages - 1:
@@ -794,11 +1176,8 @@ async def browse_messages(db):
         elif choice == 'j':
             msg_id = input("\nEnter message ID: ")
             if msg_id in messages:
-                # Find the page containing this message
-                for i, msg in enumerate(message_list):
-                    if str(msg['id']) == msg_id:
-                        current_page = i // page_size
-                        break
+                # Find the page containing this message; the IDs are sorted
+                current_page = bisect.bisect_left(message_ids, int(msg_id)) // page_size
                 # Highlight the message on the next iteration
             else:
                 print("\nMessage ID not found!")
@@ -814,6 +1193,19 @@ async def browse_messages(db):
         elif choice == 'q':
             return
         
+def _format_reaction(reaction):
+    """
+    Format one reaction as an HTML span line for view_message_html
+
+    Args:
+        reaction: Reaction dict
+
+    Returns:
+        str: Span line ending with a newline
+    """
+    emoji = reaction.get('emoticon') or f"Custom({reaction.get('document_id')})"
+    return f"      <span class='reaction'>{emoji} {reaction.get('count', 0)}</span>\n"
+
 def view_message_html(message):
     """
     Display HTML source of a message
@@ -821,7 +1213,7 @@ def view_message_html(message):
     Args:
         message: Message dictionary to display
     """
-    os.system('cls' if os.name == 'nt' else 'clear')
+    _clear_screen()
     
     print(f"\nMessage #{message['id']} HTML Source")
     print("=" * 80)
@@ -834,59 +1226,57 @@ def view_message_html(message):
         print("-" * 80)
     
     # Create structured HTML representation
-    html_content = "<div class='message'>\n"
+    parts = ["<div class='message'>\n"]
     
     # Add message header with metadata
-    html_content += f"  <div class='message-header'>\n"
-    html_content += f"    <div class='message-id'>Message ID: {message['id']}</div>\n"
-    html_content += f"    <div class='message-date'>Date: {message['date']}</div>\n"
+    parts.append(f"  <div class='message-header'>\n")
+    parts.append(f"    <div class='message-id'>Message ID: {message['id']}</div>\n")
+    parts.append(f"    <div class='message-date'>Date: {message['date']}</div>\n")
     
     if message.get('post_author'):
-        html_content += f"    <div class='message-from'>Author: {message['post_author']}</div>\n"
+        parts.append(f"    <div class='message-from'>Author: {message['post_author']}</div>\n")
     elif message.get('from_id'):
-        html_content += f"    <div class='message-from'>From: {message['from_id']}</div>\n"
+        parts.append(f"    <div class='message-from'>From: {message['from_id']}</div>\n")
     
     if message.get('views'):
-        html_content += f"    <div class='message-views'>Views: {message['views']}</div>\n"
+        parts.append(f"    <div class='message-views'>Views: {message['views']}</div>\n")
         
     if message.get('forwards'):
-        html_content += f"    <div class='message-forwards'>Forwards: {message['forwards']}</div>\n"
+        parts.append(f"    <div class='message-forwards'>Forwards: {message['forwards']}</div>\n")
     
-    html_content += "  </div>\n"
+    parts.append("  </div>\n")
     
     # Add message content
-    html_content += "  <div class='message-content'>\n"
+    parts.append("  <div class='message-content'>\n")
     
     # Use Telegram HTML if available, otherwise use our escaped version
     if message.get('text_html'):
-        html_content += f"    <div class='message-text'>{message['text_html']}</div>\n"
+        parts.append(f"    <div class='message-text'>{message['text_html']}</div>\n")
     elif message.get('text'):
         escaped_text = html.escape(message['text'])
-        html_content += f"    <div class='message-text'>{escaped_text}</div>\n"
+        parts.append(f"    <div class='message-text'>{escaped_text}</div>\n")
     
     # Include media info
     if message.get('has_media'):
-        html_content += f"    <div class='message-media'>\n"
-        html_content += f"      <div class='media-type'>{message.get('media_type', 'Unknown media')}</div>\n"
+        parts.append(f"    <div class='message-media'>\n")
+        parts.append(f"      <div class='media-type'>{message.get('media_type', 'Unknown media')}</div>\n")
         
-        if message.get('media_file_path'):
-            html_content += f"      <div class='media-path'>{message.get('media_file_path')}</div>\n"
+        media_file_path = message.get('media_file_path')
+        if media_file_path:
+            parts.append(f"      <div class='media-path'>{media_file_path}</div>\n")
             
-        html_content += "    </div>\n"
+        parts.append("    </div>\n")
     
     # Add reactions
-    if message.get('reactions') and len(message.get('reactions', [])) > 0:
-        html_content += "    <div class='message-reactions'>\n"
-        
-        for reaction in message.get('reactions', []):
-            emoji = reaction.get('emoticon') or f"Custom({reaction.get('document_id')})"
-            count = reaction.get('count', 0)
-            html_content += f"      <span class='reaction'>{emoji} {count}</span>\n"
-        
-        html_content += "    </div>\n"
+    reactions = message.get('reactions')
+    if reactions:
+        parts.append("    <div class='message-reactions'>\n")
+        parts.extend(_format_reaction(reaction) for reaction in reactions)
+        parts.append("    </div>\n")
     
-    html_content += "  </div>\n"
-    html_content += "</div>"
+    parts.append("  </div>\n")
+    parts.append("</div>")
+    html_content = "".join(parts)
     
     # Display the complete structured HTML content
     print("\nComplete Structured HTML:")
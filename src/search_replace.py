@@ -4,14 +4,25 @@ Preserves all Telegram message formatting using native entities.
 Supports both local-only and channel editing modes.
 """
 import os
+import sys
+import time
+import bisect
 import asyncio
 from datetime import datetime
 
+from telethon.errors import (
+    FloodWaitError, MessageNotModifiedError, MessageAuthorRequiredError,
+    ChatAdminRequiredError
+)
+
+from src.config import CHANNEL_EDIT_DELAY, CHANNEL_EDIT_CONCURRENCY, CHANNEL_FETCH_BATCH_SIZE
 from src.channels import get_active_channel
-from src.database import save_database
+from src.database import save_channel_items
 from src.formatting import (
     get_message_entities,
     apply_replacement_to_message,
+    apply_replacements_to_message,
+    count_matches_in_message,
     entities_to_markdown,
     get_entities_from_markdown,
     entities_to_dicts,
@@ -19,6 +30,13 @@ from src.formatting import (
     search_replace_with_entities
 )
 
+# channel_id -> {message ID: (raw_text, text, entities, folded search text)}
+_search_text_cache = {}
+# channel_id -> ((dict id, message count), sorted int IDs of messages with an edit history)
+_edited_index = {}
+# time.monotonic() when the last edit was sent to Telegram
+_last_channel_edit = 0.0
+
 
 async def search_replace_messages(db, db_path, client=None):
     """
@@ -58,9 +76,13 @@ async def search_replace_messages(db, db_path, client=None):
     print("Edit Mode:")
     print("1. Local only (modify database, not Telegram)")
     print("2. Edit in channel (modify messages on Telegram)")
+    print("3. Several replacements at once (local only, no review)")
     print("-" * 70)
 
-    mode_choice = input("Select mode (1/2): ").strip()
+    mode_choice = input("Select mode (1/2/3): ").strip()
+    if mode_choice == '3':
+        await _replace_many_local(db, db_path)
+        return
     edit_in_channel = mode_choice == '2'
 
     if edit_in_channel:
@@ -109,7 +131,52 @@ async def search_replace_messages(db, db_path, client=None):
         )
     else:
         # Local-only mode
-        _process_local_edits(db, db_path, matches, search, replace, case_sensitive)
+        _process_local_edits(db, db_path, channel_id, matches, search, replace, case_sensitive)
+
+
+async def _replace_many_local(db, db_path):
+    """
+    Ask for several search/replace pairs and apply them all in one pass.
+
+    Shows how many messages would change and asks for confirmation before
+    saving anything.
+
+    Args:
+        db: Database dictionary
+        db_path: Path to database file
+    """
+    print("\n" + "-" * 70)
+    print("Enter search/replace pairs, an empty search text to finish.")
+    pairs = []
+    while True:
+        search = input(f"Search text #{len(pairs) + 1}: ").strip()
+        if not search:
+            break
+        replace = input(f"Replacement #{len(pairs) + 1}: ").strip()
+        pairs.append((search, replace))
+
+    if not pairs:
+        print("\nNo search texts entered!")
+        return
+
+    case_choice = input("Case sensitive? (y/N): ").strip().lower()
+    case_sensitive = case_choice == 'y'
+
+    print("\nSearching...")
+    preview = await batch_search_replace_multi(db, db_path, pairs, case_sensitive, dry_run=True)
+    if not preview['found']:
+        print("\nNo messages found containing any of the search texts")
+        return
+
+    print(f"\n{preview['found']} message(s) would change, "
+          f"{preview['total_replacements']} replacement(s) in total.")
+    confirm = input("Apply these replacements? (y/N): ").strip().lower()
+    if confirm != 'y':
+        print("\nCancelled.")
+        return
+
+    result = await batch_search_replace_multi(db, db_path, pairs, case_sensitive)
+    _print_summary(result['found'], result['replaced'], 0, result['total_replacements'])
 
 
 def find_matching_messages(db, channel_id, search, case_sensitive=True):
@@ -123,17 +190,20 @@ def find_matching_messages(db, channel_id, search, case_sensitive=True):
         case_sensitive: Whether search is case sensitive
 
     Returns:
-        list: List of (message_id, message_dict, preview_dict) tuples
+        list: List of (message_id, message_dict, match_count) tuples
     """
     matches = []
     messages = db.get('messages', {}).get(channel_id, {})
+    needle = search.casefold()
 
-    for msg_id, msg in messages.items():
-        preview = apply_replacement_to_message(msg, search, '', case_sensitive)
-        if preview is not None:
-            # Re-run with actual replacement to get proper preview
-            preview = apply_replacement_to_message(msg, search, search, case_sensitive)
-            matches.append((msg_id, msg, preview))
+    # Previews are built when a match is shown, so only count here
+    for msg_id, folded in _search_texts(channel_id, messages):
+        if needle not in folded:
+            continue
+        msg = messages[msg_id]
+        count = count_matches_in_message(msg, search, case_sensitive)
+        if count:
+            matches.append((msg_id, msg, count))
 
     # Sort by message ID (numeric)
     matches.sort(key=lambda x: int(x[0]))
@@ -141,14 +211,94 @@ def find_matching_messages(db, channel_id, search, case_sensitive=True):
     return matches
 
 
-def _process_local_edits(db, db_path, matches, search, replace, case_sensitive=True):
+def _search_texts(channel_id, messages):
+    """
+    Get the casefolded text and entity URLs of each message in a channel.
+
+    Repeated searches skip the entity lookup and casefolding for messages
+    whose fields are unchanged. Any match, in either case mode, contains
+    the casefolded search text, so the folded text serves as a pre-filter.
+
+    Args:
+        channel_id: Channel ID string
+        messages: Message dict of the channel
+
+    Returns:
+        list: (message_id, folded_text) tuples
+    """
+    cached = _search_text_cache.get(channel_id, {})
+    fresh = {}
+    texts = []
+    for msg_id, msg in messages.items():
+        raw_text = msg.get('raw_text')
+        text = msg.get('text')
+        entities = msg.get('entities')
+        entry = cached.get(msg_id)
+        # Edits assign new values, so unchanged fields are the same objects
+        if not (entry and entry[0] is raw_text and entry[1] is text and entry[2] is entities):
+            raw, ents = get_message_entities(msg)
+            urls = [ent['url'] for ent in ents if isinstance(ent, dict) and ent.get('url')]
+            entry = (raw_text, text, entities, '\n'.join([raw, *urls]).casefold())
+        fresh[msg_id] = entry
+        texts.append((msg_id, entry[3]))
+    _search_text_cache[channel_id] = fresh
+    return texts
+
+
+def _edited_message_ids(channel_id, messages):
+    """
+    Get the IDs of a channel's messages that have an edit history.
+
+    The sorted list is built by one scan and then kept up to date by
+    _add_edit_history, so listing edits neither walks every message nor
+    sorts again.
+    Messages replaced since (e.g. by a re-download) may have lost their
+    history, so callers still check it.
+
+    Args:
+        channel_id: Channel ID string
+        messages: Message dict of the channel
+
+    Returns:
+        list: Message IDs sorted numerically
+    """
+    signature = (id(messages), len(messages))
+    cached = _edited_index.get(channel_id)
+    if not cached or cached[0] != signature:
+        edited = sorted(int(msg_id) for msg_id, msg in messages.items() if msg.get('edit_history'))
+        cached = (signature, edited)
+        _edited_index[channel_id] = cached
+    return [msg_id for msg_id in map(str, cached[1]) if msg_id in messages]
+
+
+def _add_edit_history(channel_id, msg_id, msg, entry):
+    """
+    Append an entry to a message's edit history and index the message.
+
+    Args:
+        channel_id: Channel ID string
+        msg_id: Message ID string
+        msg: Message dict
+        entry: Edit history entry
+    """
+    msg.setdefault('edit_history', []).append(entry)
+    cached = _edited_index.get(channel_id)
+    if cached:
+        ids = cached[1]
+        pos = bisect.bisect_left(ids, int(msg_id))
+        if pos == len(ids) or ids[pos] != int(msg_id):
+            ids.insert(pos, int(msg_id))
+
+
+def _process_local_edits(db, db_path, channel_id, matches, search, replace, case_sensitive=True):
     """
     Process search/replace with local-only edits (database only).
 
     Args:
         db: Database dictionary
         db_path: Path to database file
-        matches: List of (msg_id, msg, preview) tuples
+        channel_id: Channel ID string
+        matches: List of (msg_id, msg, match_count) tuples
         search: Search text
         replace: Replacement text
         case_sensitive: Whether search is case sensitive
@@ -165,28 +315,10 @@ def _process_local_edits(db, db_path, matches, search, replace, case_sensitive=T
 
         if action == 'approve':
             try:
-                # Store original in edit history
-                if 'edit_history' not in msg:
-                    msg['edit_history'] = []
+                _apply_local_edit(channel_id, msg_id, msg, preview_data, search, replace)
 
-                msg['edit_history'].append({
-                    'date': str(datetime.now()),
-                    'action': 'search_replace',
-                    'search': search,
-                    'replace': replace,
-                    'original_raw_text': msg.get('raw_text', ''),
-                    'original_text': msg.get('text', ''),
-                    'original_entities': msg.get('entities', [])
-                })
-
-                # Apply new values
-                msg['raw_text'] = preview_data['raw_text']
-                msg['text'] = preview_data['text']
-                msg['entities'] = preview_data['entities']
-                msg['last_update'] = str(datetime.now())
-
-                # Save database immediately
-                save_database(db_path, db)
+                # Save the edited message immediately
+                save_channel_items(db_path, 'messages', channel_id, {msg_id: msg})
 
                 applied += 1
                 total_replacements += preview_data['replacement_count']
@@ -195,6 +327,23 @@ def _process_local_edits(db, db_path, matches, search, replace, case_sensitive=T
             except Exception as e:
                 print(f"  Error updating message #{msg_id}: {e}")
 
+        elif action == 'approve_all':
+            # Apply the rest without prompting and save them in one write
+            changed = {}
+            for rest_id, rest_msg, _ in matches[i - 1:]:
+                preview = apply_replacement_to_message(rest_msg, search, replace, case_sensitive)
+                if not preview:
+                    skipped += 1
+                    continue
+                _apply_local_edit(channel_id, rest_id, rest_msg, preview, search, replace)
+                changed[rest_id] = rest_msg
+                applied += 1
+                total_replacements += preview['replacement_count']
+            if changed:
+                save_channel_items(db_path, 'messages', channel_id, changed)
+            print(f"  {len(changed)} message(s) updated locally.")
+            break
+
         elif action == 'skip':
             skipped += 1
             print(f"  Message #{msg_id} skipped.")
@@ -209,6 +358,37 @@ def _process_local_edits(db, db_path, matches, search, replace, case_sensitive=T
     _print_summary(len(matches), applied, skipped, total_replacements, channel_edited=False)
 
 
+def _apply_local_edit(channel_id, msg_id, msg, preview_data, search, replace):
+    """
+    Apply an approved replacement to a local message, keeping the original in its edit history.
+
+    Args:
+        channel_id: Channel ID string
+        msg_id: Message ID string
+        msg: Message dict
+        preview_data: Replacement result from apply_replacement_to_message
+        search: Search text
+        replace: Replacement text
+    """
+    now = str(datetime.now())
+    # Store original in edit history
+    _add_edit_history(channel_id, msg_id, msg, {
+        'date': now,
+        'action': 'search_replace',
+        'search': search,
+        'replace': replace,
+        'original_raw_text': msg.get('raw_text', ''),
+        'original_text': msg.get('text', ''),
+        'original_entities': msg.get('entities', [])
+    })
+
+    # Apply new values
+    msg['raw_text'] = preview_data['raw_text']
+    msg['text'] = preview_data['text']
+    msg['entities'] = preview_data['entities']
+    msg['last_update'] = now
+
+
 async def _process_channel_edits(client, db, db_path, active, channel_id,
                                   matches, search, replace, case_sensitive):
     """
@@ -220,7 +400,7 @@ async def _process_channel_edits(client, db, db_path, active, channel_id,
         db_path: Path to database file
         active: Active channel dict
         channel_id: Channel ID string
-        matches: List of (msg_id, msg, preview) tuples
+        matches: List of (msg_id, msg, match_count) tuples
         search: Search text
         replace: Replacement text
         case_sensitive: Whether search is case sensitive
@@ -255,116 +435,37 @@ async def _process_channel_edits(client, db, db_path, active, channel_id,
             continue
 
         if action == 'approve':
-            try:
-                # Fetch fresh message from Telegram to get current entities
-                print(f"  Fetching message #{msg_id} from Telegram...")
-                telegram_msg = await client.get_messages(active['id'], ids=int(msg_id))
-
-                if not telegram_msg:
-                    print(f"  Error: Message #{msg_id} not found on Telegram!")
-                    errors += 1
-                    continue
-
-                # Get fresh text and entities from Telegram
-                fresh_raw_text = telegram_msg.raw_text or ''
-                fresh_entities = telegram_msg.entities or []
-
-                if not fresh_raw_text:
-                    print(f"  Error: Message #{msg_id} has no text content!")
-                    errors += 1
-                    continue
-
-                # Apply replacement to fresh data
-                new_raw_text, new_entities_dicts, count = search_replace_with_entities(
-                    fresh_raw_text, fresh_entities, search, replace, case_sensitive
-                )
-
-                # Check if URLs were changed (even if text count is 0)
-                fresh_entities_dicts = entities_to_dicts(fresh_entities)
-                old_urls = [e.get('url', '') for e in fresh_entities_dicts if isinstance(e, dict) and e.get('url')]
-                new_urls = [e.get('url', '') for e in new_entities_dicts if isinstance(e, dict) and e.get('url')]
-                url_changes = sum(1 for old, new in zip(old_urls, new_urls) if old != new)
-
-                if count == 0 and url_changes == 0:
-                    print(f"  Warning: No replacements made in message #{msg_id} (text may have changed)")
-                    skipped += 1
-                    continue
-
-                total_changes = count + url_changes
-
-                # Convert entity dicts back to Telegram entity objects for editing
-                new_entity_objs = dicts_to_entities(new_entities_dicts)
-
-                # Store FRESH backup from Telegram BEFORE editing
-                # (fresh_entities_dicts already computed above for URL check)
-                backup_entry = {
-                    'date': str(datetime.now()),
-                    'action': 'channel_search_replace',
-                    'search': search,
-                    'replace': replace,
-                    'telegram_raw_text': fresh_raw_text,
-                    'telegram_text': entities_to_markdown(fresh_raw_text, fresh_entities_dicts),
-                    'telegram_entities': fresh_entities_dicts,
-                    'local_raw_text': msg.get('raw_text', ''),
-                    'local_text': msg.get('text', ''),
-                    'local_entities': msg.get('entities', []),
-                    'can_restore': True
-                }
-
-                # Edit message on Telegram
-                changes_info = f"{count} text" if count > 0 else ""
-                if url_changes > 0:
-                    changes_info += f"{', ' if changes_info else ''}{url_changes} URL(s)"
-                print(f"  Editing message #{msg_id} on Telegram ({changes_info})...")
-                await client.edit_message(
-                    active['id'],
-                    int(msg_id),
-                    new_raw_text,
-                    formatting_entities=new_entity_objs
-                )
-
-                # Store backup in edit history
-                if 'edit_history' not in msg:
-                    msg['edit_history'] = []
-                msg['edit_history'].append(backup_entry)
-
-                # Update local database
-                msg['raw_text'] = new_raw_text
-                msg['text'] = entities_to_markdown(new_raw_text, new_entities_dicts)
-                msg['entities'] = new_entities_dicts
-                msg['last_update'] = str(datetime.now())
-                msg['edited_on_telegram'] = True
-
-                save_database(db_path, db)
+            status, edit = await _edit_in_channel(
+                client, active, msg_id, msg, search, replace, case_sensitive
+            )
+            if status == 'edited':
+                await asyncio.to_thread(save_channel_items, db_path, 'messages', channel_id, {msg_id: msg})
 
                 applied += 1
-                total_replacements += total_changes
+                total_replacements += edit['count']
                 print(f"  Message #{msg_id} edited on Telegram and saved locally.")
 
                 # Store as last edit for potential undo
-                last_edit = {
-                    'msg_id': msg_id,
-                    'msg': msg,
-                    'backup_entry': backup_entry,
-                    'count': total_changes
-                }
-
-                await asyncio.sleep(0.5)
-
-            except Exception as e:
-                error_msg = str(e)
-                if 'MESSAGE_NOT_MODIFIED' in error_msg:
-                    print(f"  Message #{msg_id} was not modified (content unchanged).")
-                    skipped += 1
-                elif 'MESSAGE_AUTHOR_REQUIRED' in error_msg:
-                    print(f"  Error: No permission to edit message #{msg_id} (not the author).")
-                    errors += 1
-                elif 'CHAT_ADMIN_REQUIRED' in error_msg:
-                    print(f"  Error: Admin rights required to edit message #{msg_id}.")
-                    errors += 1
-                else:
-                    print(f"  Error editing message #{msg_id}: {e}")
-                    errors += 1
+                last_edit = edit
+            elif status == 'skipped':
+                skipped += 1
+            else:
+                errors += 1
+
+        elif action == 'approve_all':
+            # Edit the rest without prompting, several at a time
+            print(f"  Editing {len(matches) - i + 1} message(s) on Telegram...")
+            result = await _batch_edit_in_channel(
+                client, db_path, active, channel_id, matches[i - 1:],
+                search, replace, case_sensitive, CHANNEL_EDIT_CONCURRENCY
+            )
+            applied += result['replaced']
+            skipped += result['skipped']
+            errors += result['errors']
+            total_replacements += result['total_replacements']
+            # Batch edits are undone through the restore menu
+            last_edit = None
+            break
 
         elif action == 'skip':
             skipped += 1
@@ -394,6 +495,128 @@ async def _process_channel_edits(client, db, db_path, active, channel_id,
                    channel_edited=True, errors=errors, restored=restored)
 
 
+async def _edit_in_channel(client, active, msg_id, msg, search, replace, case_sensitive,
+                           prefetched=None):
+    """
+    Apply a replacement to the current version of a message on Telegram.
+
+    The message is fetched fresh so the edit starts from its current text
+    and entities, which are kept as a backup in the edit history. The local
+    message is updated but not saved.
+
+    Args:
+        client: Telegram client
+        active: Active channel dict
+        msg_id: Message ID string
+        msg: Local message dict
+        search: Search text
+        replace: Replacement text
+        case_sensitive: Whether search is case sensitive
+        prefetched: Optional dict of Telegram messages fetched in advance,
+                    by integer ID (None if deleted); messages missing from
+                    it are fetched here
+
+    Returns:
+        tuple: (status, edit) where status is 'edited', 'skipped' or 'error'
+               and edit is the {'msg_id', 'msg', 'backup_entry', 'count'}
+               dict of an edited message (None otherwise)
+    """
+    try:
+        if prefetched is not None and int(msg_id) in prefetched:
+            telegram_msg = prefetched[int(msg_id)]
+        else:
+            # Fetch fresh message from Telegram to get current entities
+            print(f"  Fetching message #{msg_id} from Telegram...")
+            telegram_msg = await client.get_messages(active['id'], ids=int(msg_id))
+
+        if not telegram_msg:
+            print(f"  Error: Message #{msg_id} not found on Telegram!")
+            return 'error', None
+
+        # Get fresh text and entities from Telegram
+        fresh_raw_text = telegram_msg.raw_text or ''
+        fresh_entities = telegram_msg.entities or []
+
+        if not fresh_raw_text:
+            print(f"  Error: Message #{msg_id} has no text content!")
+            return 'error', None
+
+        # Apply replacement to fresh data
+        new_raw_text, new_entities_dicts, count, url_changes = search_replace_with_entities(
+            fresh_raw_text, fresh_entities, search, replace, case_sensitive
+        )
+        fresh_entities_dicts = entities_to_dicts(fresh_entities)
+
+        if count == 0 and url_changes == 0:
+            print(f"  Warning: No replacements made in message #{msg_id} (text may have changed)")
+            return 'skipped', None
+
+        # Convert entity dicts back to Telegram entity objects for editing
+        new_entity_objs = dicts_to_entities(new_entities_dicts)
+
+        now = str(datetime.now())
+        # Store FRESH backup from Telegram BEFORE editing
+        backup_entry = {
+            'date': now,
+            'action': 'channel_search_replace',
+            'search': search,
+            'replace': replace,
+            'telegram_raw_text': fresh_raw_text,
+            'telegram_text': entities_to_markdown(fresh_raw_text, fresh_entities_dicts),
+            'telegram_entities': fresh_entities_dicts,
+            'local_raw_text': msg.get('raw_text', ''),
+            'local_text': msg.get('text', ''),
+            'local_entities': msg.get('entities', []),
+            'can_restore': True
+        }
+
+        # Edit message on Telegram
+        changes_info = f"{count} text" if count > 0 else ""
+        if url_changes > 0:
+            changes_info += f"{', ' if changes_info else ''}{url_changes} URL(s)"
+        print(f"  Editing message #{msg_id} on Telegram ({changes_info})...")
+        await _wait_for_edit_slot()
+        await client.edit_message(
+            active['id'],
+            int(msg_id),
+            new_raw_text,
+            formatting_entities=new_entity_objs
+        )
+
+        # Store backup in edit history
+        _add_edit_history(str(active['id']), msg_id, msg, backup_entry)
+
+        # Update local database
+        msg['raw_text'] = new_raw_text
+        msg['text'] = entities_to_markdown(new_raw_text, new_entities_dicts)
+        msg['entities'] = new_entities_dicts
+        msg['last_update'] = now
+        msg['edited_on_telegram'] = True
+
+        return 'edited', {
+            'msg_id': msg_id,
+            'msg': msg,
+            'backup_entry': backup_entry,
+            'count': count
+        }
+
+    except FloodWaitError as e:
+        print(f"  Error: Telegram asks to wait {e.seconds} seconds before editing message #{msg_id}.")
+        return 'error', None
+    except MessageNotModifiedError:
+        print(f"  Message #{msg_id} was not modified (content unchanged).")
+        return 'skipped', None
+    except MessageAuthorRequiredError:
+        print(f"  Error: No permission to edit message #{msg_id} (not the author).")
+        return 'error', None
+    except ChatAdminRequiredError:
+        print(f"  Error: Admin rights required to edit message #{msg_id}.")
+        return 'error', None
+    except Exception as e:
+        print(f"  Error editing message #{msg_id}: {e}")
+        return 'error', None
+
+
 async def _undo_last_edit(client, active, db, db_path, last_edit):
     """
     Undo the last channel edit by restoring original message.
@@ -416,6 +639,7 @@ async def _undo_last_edit(client, active, db, db_path, last_edit):
         print(f"  Restoring message #{msg_id} to original...")
         original_entity_objs = dicts_to_entities(backup['telegram_entities'])
 
+        await _wait_for_edit_slot()
         await client.edit_message(
             active['id'],
             int(msg_id),
@@ -424,19 +648,19 @@ async def _undo_last_edit(client, active, db, db_path, last_edit):
         )
 
         # Update backup entry
+        now = str(datetime.now())
         backup['restored'] = True
-        backup['restore_date'] = str(datetime.now())
+        backup['restore_date'] = now
         backup['can_restore'] = False
 
         # Restore local database
         msg['raw_text'] = backup['telegram_raw_text']
         msg['text'] = backup['telegram_text']
         msg['entities'] = backup['telegram_entities']
-        msg['last_update'] = str(datetime.now())
+        msg['last_update'] = now
         msg['restored_from_backup'] = True
 
-        save_database(db_path, db)
-        await asyncio.sleep(0.5)
+        await asyncio.to_thread(save_channel_items, db_path, 'messages', active['id'], {msg_id: msg})
         return True
 
     except Exception as e:
@@ -445,6 +669,23 @@ async def _undo_last_edit(client, active, db, db_path, last_edit):
         return False
 
 
+async def _wait_for_edit_slot():
+    """
+    Keep edits sent to Telegram at least CHANNEL_EDIT_DELAY seconds apart.
+
+    Only the part of the delay not already spent waiting for the user's
+    choice is slept. Each caller reserves its slot before sleeping, so
+    concurrent edits are spaced out too. Short flood waits are slept
+    through by the client itself (FLOOD_SLEEP_THRESHOLD).
+    """
+    global _last_channel_edit
+    now = time.monotonic()
+    slot = max(now, _last_channel_edit + CHANNEL_EDIT_DELAY)
+    _last_channel_edit = slot
+    if slot > now:
+        await asyncio.sleep(slot - now)
+
+
 def _print_summary(total_found, applied, skipped, total_replacements,
                    channel_edited=False, errors=0, restored=0):
     """Print summary of search/replace operation."""
@@ -480,90 +721,93 @@ def display_and_get_action(msg_id, msg, current, total, search, replace,
         last_edit: Dict with info about last edited message (for undo option)
 
     Returns:
-        tuple: (action_str, preview_data) where action is 'approve', 'skip', 'quit', 'cancel', 'undo'
-               and preview_data is the replacement preview dict (or None if skipped)
+        tuple: (action_str, preview_data) where action is 'approve', 'approve_all', 'skip',
+               'quit', 'cancel', 'undo' and preview_data is the replacement preview dict (or None if skipped)
     """
-    # Get original text for display
-    raw_text, entities = get_message_entities(msg)
-    original_markdown = entities_to_markdown(raw_text, entities)
-
     # Generate preview with replacement using the user's case sensitivity choice
     actual_preview = apply_replacement_to_message(msg, search, replace, case_sensitive)
 
     if not actual_preview:
         return 'skip', None
 
+    # Get original text for display
+    raw_text, entities = get_message_entities(msg)
+    original_markdown = entities_to_markdown(raw_text, entities)
+
     new_markdown = actual_preview['text']
     replacement_count = actual_preview['replacement_count']
 
-    # Count URL replacements (not counted in replacement_count)
-    url_replacements = 0
-    # Get original entities (from stored or parsed from markdown)
-    _, old_entities = get_message_entities(msg)
-    new_entities = actual_preview['entities']
-
-    # Compare URLs in entities
-    old_urls = [e.get('url', '') for e in old_entities if isinstance(e, dict) and e.get('url')]
-    new_urls = [e.get('url', '') for e in new_entities if isinstance(e, dict) and e.get('url')]
-
-    for old_url, new_url in zip(old_urls, new_urls):
-        if old_url != new_url:
-            url_replacements += 1
+    # URL replacements are not counted in replacement_count
+    url_replacements = actual_preview['url_count']
+
+    # Nothing shown changes between prompts, so build both screens once
+    mode_indicator = " [CHANNEL EDIT]" if channel_edit_mode else ""
+    lines = [
+        "\n" + "=" * 70,
+        f"MESSAGE {current} of {total} (ID: #{msg_id}){mode_indicator}",
+        f"Date: {msg.get('date', 'Unknown')}",
+        "=" * 70,
+    ]
+
+    # Show last edit info if available (for undo option)
+    if last_edit and channel_edit_mode:
+        lines.append(f"[Last edited: #{last_edit['msg_id']} - press U to undo]")
+        lines.append("=" * 70)
+
+    lines += [
+        "\nORIGINAL:",
+        "-" * 70,
+        original_markdown,
+        "\n" + "-" * 70,
+        f"AFTER REPLACEMENT ('{search}' -> '{replace}'):",
+        "-" * 70,
+        new_markdown,
+        "\n" + "-" * 70,
+    ]
+
+    changes_desc = f"Changes: {replacement_count} text replacement(s)"
+    if url_replacements > 0:
+        changes_desc += f", {url_replacements} URL(s)"
+    lines.append(changes_desc)
+    if channel_edit_mode:
+        lines.append("(Will edit message on Telegram)")
+    lines.append("-" * 70)
+
+    if channel_edit_mode:
+        if last_edit:
+            lines.append("\n[A]pprove & Edit  A[L]l remaining  [S]kip  [U]ndo last  [V]iew full  [Q]uit  [C]ancel")
+        else:
+            lines.append("\n[A]pprove & Edit  A[L]l remaining  [S]kip  [V]iew full  [Q]uit  [C]ancel all")
+    else:
+        lines.append("\n[A]pprove  A[L]l remaining  [S]kip  [V]iew full  [Q]uit (save approved)  [C]ancel all")
+    screen = "\n".join(lines)
+
+    full_view = "\n".join([
+        "\n" + "=" * 70,
+        "FULL ORIGINAL MESSAGE:",
+        "=" * 70,
+        original_markdown,
+        "\n" + "=" * 70,
+        "FULL MESSAGE AFTER REPLACEMENT:",
+        "=" * 70,
+        new_markdown,
+    ])
 
     while True:
-        print("\n" + "=" * 70)
-        mode_indicator = " [CHANNEL EDIT]" if channel_edit_mode else ""
-        print(f"MESSAGE {current} of {total} (ID: #{msg_id}){mode_indicator}")
-        print(f"Date: {msg.get('date', 'Unknown')}")
-        print("=" * 70)
-
-        # Show last edit info if available (for undo option)
-        if last_edit and channel_edit_mode:
-            print(f"[Last edited: #{last_edit['msg_id']} - press U to undo]")
-            print("=" * 70)
-
-        print("\nORIGINAL:")
-        print("-" * 70)
-        print(original_markdown)
-
-        print("\n" + "-" * 70)
-        print(f"AFTER REPLACEMENT ('{search}' -> '{replace}'):")
-        print("-" * 70)
-        print(new_markdown)
-
-        print("\n" + "-" * 70)
-        changes_desc = f"Changes: {replacement_count} text replacement(s)"
-        if url_replacements > 0:
-            changes_desc += f", {url_replacements} URL(s)"
-        print(changes_desc)
-        if channel_edit_mode:
-            print("(Will edit message on Telegram)")
-        print("-" * 70)
-
-        if channel_edit_mode:
-            if last_edit:
-                print("\n[A]pprove & Edit  [S]kip  [U]ndo last  [V]iew full  [Q]uit  [C]ancel")
-            else:
-                print("\n[A]pprove & Edit  [S]kip  [V]iew full  [Q]uit  [C]ancel all")
-        else:
-            print("\n[A]pprove  [S]kip  [V]iew full  [Q]uit (save approved)  [C]ancel all")
+        print(screen)
         choice = input("Enter choice: ").strip().lower()
 
         if choice == 'a':
-            # Update replacement count to include URL changes
-            actual_preview['replacement_count'] = replacement_count + url_replacements
             return 'approve', actual_preview
+        elif choice == 'l':
+            remaining = total - current + 1
+            confirm = input(f"Approve all {remaining} remaining message(s) without review? (y/N): ").strip().lower()
+            if confirm == 'y':
+                return 'approve_all', None
         elif choice == 's':
             return 'skip', None
         elif choice == 'v':
-            print("\n" + "=" * 70)
-            print("FULL ORIGINAL MESSAGE:")
-            print("=" * 70)
-            print(original_markdown)
-            print("\n" + "=" * 70)
-            print("FULL MESSAGE AFTER REPLACEMENT:")
-            print("=" * 70)
-            print(new_markdown)
+            print(full_view)
             input("\nPress Enter to continue...")
         elif choice == 'u' and last_edit and channel_edit_mode:
             return 'undo', None
@@ -572,13 +816,15 @@ def display_and_get_action(msg_id, msg, current, total, search, replace,
         elif choice == 'c':
             return 'cancel', None
         else:
-            valid_choices = "A, S, V, Q, or C"
+            valid_choices = "A, L, S, V, Q, or C"
             if last_edit and channel_edit_mode:
-                valid_choices = "A, S, U, V, Q, or C"
+                valid_choices = "A, L, S, U, V, Q, or C"
             print(f"Invalid choice. Please enter {valid_choices}.")
 
 
-async def batch_search_replace(db, db_path, search, replace, case_sensitive=True, dry_run=False):
+async def batch_search_replace(db, db_path, search, replace, case_sensitive=True, dry_run=False,
+                               client=None, edit_in_channel=False,
+                               concurrency=CHANNEL_EDIT_CONCURRENCY):
     """
     Batch search and replace without interactive approval.
     Useful for scripting or when you're sure about the replacement.
@@ -590,6 +836,9 @@ async def batch_search_replace(db, db_path, search, replace, case_sensitive=True
         replace: Text to replace with
         case_sensitive: Whether search is case sensitive
         dry_run: If True, don't actually apply changes
+        client: Telegram client, required for edit_in_channel
+        edit_in_channel: If True, edit the messages on Telegram as well
+        concurrency: Maximum channel edits in flight at the same time
 
     Returns:
         dict: Statistics about the operation
@@ -602,7 +851,9 @@ async def batch_search_replace(db, db_path, search, replace, case_sensitive=True
     if channel_id not in db.get('messages', {}):
         return {'error': 'No messages for this channel'}
 
-    messages = db['messages'][channel_id]
+    if edit_in_channel and not client:
+        return {'error': 'Client not available for channel editing'}
+
     matches = find_matching_messages(db, channel_id, search, case_sensitive)
 
     if not matches:
@@ -612,18 +863,24 @@ async def batch_search_replace(db, db_path, search, replace, case_sensitive=True
             'total_replacements': 0
         }
 
+    if edit_in_channel and not dry_run:
+        return await _batch_edit_in_channel(
+            client, db_path, active, channel_id, matches,
+            search, replace, case_sensitive, concurrency
+        )
+
     replaced = 0
     total_replacements = 0
+    changed = {}
+    now = str(datetime.now())
 
     for msg_id, msg, _ in matches:
         preview = apply_replacement_to_message(msg, search, replace, case_sensitive)
         if preview:
             if not dry_run:
                 # Store original
-                if 'edit_history' not in msg:
-                    msg['edit_history'] = []
-                msg['edit_history'].append({
-                    'date': str(datetime.now()),
+                _add_edit_history(channel_id, msg_id, msg, {
+                    'date': now,
                     'action': 'batch_search_replace',
                     'search': search,
                     'replace': replace,
@@ -635,13 +892,14 @@ async def batch_search_replace(db, db_path, search, replace, case_sensitive=True
                 msg['raw_text'] = preview['raw_text']
                 msg['text'] = preview['text']
                 msg['entities'] = preview['entities']
-                msg['last_update'] = str(datetime.now())
+                msg['last_update'] = now
+                changed[msg_id] = msg
 
             replaced += 1
             total_replacements += preview['replacement_count']
 
-    if not dry_run:
-        save_database(db_path, db)
+    if changed:
+        await asyncio.to_thread(save_channel_items, db_path, 'messages', channel_id, changed)
 
     return {
         'found': len(matches),
@@ -651,6 +909,156 @@ async def batch_search_replace(db, db_path, search, replace, case_sensitive=True
     }
 
 
+async def batch_search_replace_multi(db, db_path, pairs, case_sensitive=True, dry_run=False):
+    """
+    Batch search and replace several pairs in one pass over the messages.
+
+    Each message is checked for all search texts at once and rewritten at
+    most once, instead of one full scan per pair. At the same position the
+    earlier pair wins.
+
+    Args:
+        db: Database dictionary
+        db_path: Path to database file
+        pairs: List of (search, replace) tuples
+        case_sensitive: Whether search is case sensitive
+        dry_run: If True, don't actually apply changes
+
+    Returns:
+        dict: Statistics about the operation
+    """
+    active = get_active_channel(db)
+    if not active:
+        return {'error': 'No active channel selected'}
+
+    channel_id = str(active['id'])
+    if channel_id not in db.get('messages', {}):
+        return {'error': 'No messages for this channel'}
+
+    pairs = [(search, replace) for search, replace in pairs if search]
+    messages = db['messages'][channel_id]
+    needles = [search.casefold() for search, _ in pairs]
+
+    found = 0
+    total_replacements = 0
+    changed = {}
+    now = str(datetime.now())
+
+    for msg_id, folded in _search_texts(channel_id, messages):
+        if not any(needle in folded for needle in needles):
+            continue
+        msg = messages[msg_id]
+        preview = apply_replacements_to_message(msg, pairs, case_sensitive)
+        if not preview:
+            continue
+
+        if not dry_run:
+            # Store original
+            _add_edit_history(channel_id, msg_id, msg, {
+                'date': now,
+                'action': 'batch_search_replace',
+                'pairs': [list(pair) for pair in pairs],
+                'original_raw_text': msg.get('raw_text', ''),
+                'original_text': msg.get('text', '')
+            })
+
+            # Apply changes
+            msg['raw_text'] = preview['raw_text']
+            msg['text'] = preview['text']
+            msg['entities'] = preview['entities']
+            msg['last_update'] = now
+            changed[msg_id] = msg
+
+        found += 1
+        total_replacements += preview['replacement_count']
+
+    if changed:
+        await asyncio.to_thread(save_channel_items, db_path, 'messages', channel_id, changed)
+
+    return {
+        'found': found,
+        'replaced': found,
+        'total_replacements': total_replacements,
+        'dry_run': dry_run
+    }
+
+
+async def _batch_edit_in_channel(client, db_path, active, channel_id, matches,
+                                 search, replace, case_sensitive, concurrency):
+    """
+    Edit all matching messages on Telegram, several at a time.
+
+    The current versions of the messages are fetched up to
+    CHANNEL_FETCH_BATCH_SIZE per request. Edits are still spaced out by
+    CHANNEL_EDIT_DELAY, but the round trips of up to `concurrency`
+    messages overlap. Each message is saved with its edit history backup
+    as soon as its edit succeeds, so an interrupted run keeps the restore
+    data of every edit already made on Telegram.
+
+    Args:
+        client: Telegram client
+        db_path: Path to database file
+        active: Active channel dict
+        channel_id: Channel ID string
+        matches: List of (msg_id, msg, match_count) tuples
+        search: Search text
+        replace: Replacement text
+        case_sensitive: Whether search is case sensitive
+        concurrency: Maximum edits in flight at the same time
+
+    Returns:
+        dict: Statistics about the operation
+    """
+    # Fetch the current versions of all matches in a few requests
+    ids = [int(msg_id) for msg_id, _, _ in matches]
+    prefetched = {}
+    for start in range(0, len(ids), CHANNEL_FETCH_BATCH_SIZE):
+        batch = ids[start:start + CHANNEL_FETCH_BATCH_SIZE]
+        try:
+            fetched = await client.get_messages(active['id'], ids=batch)
+        except Exception as e:
+            # Messages left out are fetched one by one when edited
+            print(f"  Error fetching messages #{batch[0]}-#{batch[-1]}: {e}")
+            continue
+        # Deleted messages come back as None and stay None here
+        prefetched.update(zip(batch, fetched))
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def edit_one(msg_id, msg):
+        async with semaphore:
+            status, edit = await _edit_in_channel(
+                client, active, msg_id, msg, search, replace, case_sensitive, prefetched
+            )
+        if status == 'edited':
+            await asyncio.to_thread(save_channel_items, db_path, 'messages', channel_id, {msg_id: msg})
+        return status, edit
+
+    results = await asyncio.gather(*(edit_one(msg_id, msg) for msg_id, msg, _ in matches))
+
+    replaced = 0
+    total_replacements = 0
+    skipped = 0
+    errors = 0
+    for status, edit in results:
+        if status == 'edited':
+            replaced += 1
+            total_replacements += edit['count']
+        elif status == 'skipped':
+            skipped += 1
+        else:
+            errors += 1
+
+    return {
+        'found': len(matches),
+        'replaced': replaced,
+        'skipped': skipped,
+        'errors': errors,
+        'total_replacements': total_replacements,
+        'dry_run': False
+    }
+
+
 async def restore_edited_messages(db, db_path, client=None):
     """
     Restore messages that were edited via channel search/replace.
@@ -676,7 +1084,8 @@ async def restore_edited_messages(db, db_path, client=None):
 
     # Find messages with restorable edits
     restorable = []
-    for msg_id, msg in messages.items():
+    for msg_id in _edited_message_ids(channel_id, messages):
+        msg = messages[msg_id]
         if 'edit_history' in msg and msg['edit_history']:
             # Check for channel edits that can be restored
             for i, entry in enumerate(msg['edit_history']):
@@ -725,6 +1134,15 @@ async def restore_edited_messages(db, db_path, client=None):
             print("\nCancelled.")
             return
 
+    # Resolve the channel once instead of on every edit
+    peer = None
+    if restore_in_channel:
+        try:
+            peer = await client.get_input_entity(active['id'])
+        except Exception as e:
+            print(f"\nError: Could not resolve the channel: {e}")
+            return
+
     # Process restorable messages
     restored = 0
     skipped = 0
@@ -754,79 +1172,49 @@ async def restore_edited_messages(db, db_path, client=None):
 
         print("\n" + "-" * 70)
         if restore_in_channel:
-            print("[R]estore on Telegram  [S]kip  [Q]uit")
+            print("[R]estore on Telegram  [A]ll remaining  [S]kip  [Q]uit")
         else:
-            print("[R]estore locally  [S]kip  [Q]uit")
+            print("[R]estore locally  [A]ll remaining  [S]kip  [Q]uit")
 
         choice = input("Enter choice: ").strip().lower()
 
         if choice == 'r':
-            try:
-                original_raw_text = entry.get('telegram_raw_text', '')
-                original_entities = entry.get('telegram_entities', [])
-
-                if not original_raw_text:
-                    print(f"  Error: No backup data for message #{msg_id}")
-                    errors += 1
-                    continue
-
+            status = await _restore_entry(client, peer, item, restore_in_channel)
+            if status == 'restored':
+                await asyncio.to_thread(save_channel_items, db_path, 'messages', channel_id, {msg_id: msg})
                 if restore_in_channel:
-                    # Restore on Telegram
-                    print(f"  Restoring message #{msg_id} on Telegram...")
-                    original_entity_objs = dicts_to_entities(original_entities)
-
-                    await client.edit_message(
-                        active['id'],
-                        int(msg_id),
-                        original_raw_text,
-                        formatting_entities=original_entity_objs
-                    )
-
-                    # Mark as restored in history
-                    entry['restored'] = True
-                    entry['restore_date'] = str(datetime.now())
-                    entry['can_restore'] = False  # Already restored
-
-                    # Update local database
-                    msg['raw_text'] = original_raw_text
-                    msg['text'] = entry.get('telegram_text', '')
-                    msg['entities'] = original_entities
-                    msg['last_update'] = str(datetime.now())
-                    msg['restored_from_backup'] = True
-
-                    save_database(db_path, db)
                     print(f"  Message #{msg_id} restored on Telegram!")
-
-                    # Rate limiting delay
-                    await asyncio.sleep(0.5)
-
                 else:
-                    # Local-only restore
-                    entry['restored'] = True
-                    entry['restore_date'] = str(datetime.now())
-                    entry['restored_locally_only'] = True
-
-                    msg['raw_text'] = original_raw_text
-                    msg['text'] = entry.get('telegram_text', '')
-                    msg['entities'] = original_entities
-                    msg['last_update'] = str(datetime.now())
-
-                    save_database(db_path, db)
                     print(f"  Message #{msg_id} restored locally (not on Telegram).")
-
                 restored += 1
-
-            except Exception as e:
-                error_msg = str(e)
-                if 'MESSAGE_NOT_MODIFIED' in error_msg:
-                    print(f"  Message #{msg_id} content unchanged.")
+            elif status == 'skipped':
+                skipped += 1
+            else:
+                errors += 1
+
+        elif choice == 'a':
+            remaining = restorable[i - 1:]
+            confirm = input(f"Restore all {len(remaining)} remaining message(s) without review? (y/N): ").strip().lower()
+            if confirm != 'y':
+                skipped += 1
+                print(f"  Message #{msg_id} skipped.")
+                continue
+
+            # Restore the rest without prompting and save them in one write
+            statuses = await _restore_many(client, peer, remaining, restore_in_channel)
+            changed = {}
+            for rest, status in zip(remaining, statuses):
+                if status == 'restored':
+                    changed[rest['msg_id']] = rest['msg']
+                    restored += 1
+                elif status == 'skipped':
                     skipped += 1
-                elif 'MESSAGE_AUTHOR_REQUIRED' in error_msg:
-                    print(f"  Error: No permission to edit message #{msg_id}.")
-                    errors += 1
                 else:
-                    print(f"  Error restoring message #{msg_id}: {e}")
                     errors += 1
+            if changed:
+                await asyncio.to_thread(save_channel_items, db_path, 'messages', channel_id, changed)
+            print(f"  {len(changed)} message(s) restored.")
+            break
 
         elif choice == 's':
             skipped += 1
@@ -839,16 +1227,135 @@ async def restore_edited_messages(db, db_path, client=None):
             skipped += 1
 
     # Summary
-    print("\n" + "=" * 70)
-    print("                        RESTORE SUMMARY")
-    print("=" * 70)
-    print(f"\nTotal restorable messages: {len(restorable)}")
-    print(f"Messages restored: {restored}")
-    print(f"Messages skipped: {skipped}")
+    lines = [
+        "\n" + "=" * 70,
+        "                        RESTORE SUMMARY",
+        "=" * 70,
+        f"\nTotal restorable messages: {len(restorable)}",
+        f"Messages restored: {restored}",
+        f"Messages skipped: {skipped}",
+    ]
     if errors > 0:
-        print(f"Errors: {errors}")
+        lines.append(f"Errors: {errors}")
     if restore_in_channel:
-        print("\nNote: Messages were restored directly on Telegram channel.")
+        lines.append("\nNote: Messages were restored directly on Telegram channel.")
+    sys.stdout.write("\n".join(lines) + "\n")
+
+
+async def _restore_many(client, peer, items, restore_in_channel,
+                        concurrency=CHANNEL_EDIT_CONCURRENCY):
+    """
+    Restore several history entries, several messages at a time.
+
+    Entries of the same message are restored one after another in list
+    order, so the last one wins as in the interactive loop. Edits are
+    still spaced out by CHANNEL_EDIT_DELAY.
+
+    Args:
+        client: Telegram client (used when restore_in_channel)
+        peer: Resolved input entity of the channel (used when restore_in_channel)
+        items: List of dicts with msg_id, msg and entry
+        restore_in_channel: If True, also edit the messages on Telegram
+        concurrency: Maximum messages restored at the same time
+
+    Returns:
+        list: Status of each item, as returned by _restore_entry
+    """
+    statuses = [None] * len(items)
+    by_message = {}
+    for index, item in enumerate(items):
+        by_message.setdefault(item['msg_id'], []).append(index)
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def restore_message(indexes):
+        async with semaphore:
+            for index in indexes:
+                statuses[index] = await _restore_entry(client, peer, items[index], restore_in_channel)
+
+    await asyncio.gather(*(restore_message(indexes) for indexes in by_message.values()))
+    return statuses
+
+
+async def _restore_entry(client, peer, item, restore_in_channel):
+    """
+    Restore one message to the version saved in an edit history entry.
+
+    The local message and the history entry are updated but not saved.
+
+    Args:
+        client: Telegram client (used when restore_in_channel)
+        peer: Resolved input entity of the channel (used when restore_in_channel)
+        item: Dict with msg_id, msg and entry of the edit to undo
+        restore_in_channel: If True, also edit the message on Telegram
+
+    Returns:
+        str: 'restored', 'skipped' or 'error'
+    """
+    msg_id = item['msg_id']
+    msg = item['msg']
+    entry = item['entry']
+
+    try:
+        original_raw_text = entry.get('telegram_raw_text', '')
+        original_entities = entry.get('telegram_entities', [])
+
+        if not original_raw_text:
+            print(f"  Error: No backup data for message #{msg_id}")
+            return 'error'
+
+        if restore_in_channel:
+            # Restore on Telegram
+            print(f"  Restoring message #{msg_id} on Telegram...")
+            original_entity_objs = dicts_to_entities(original_entities)
+
+            await _wait_for_edit_slot()
+            await client.edit_message(
+                peer,
+                int(msg_id),
+                original_raw_text,
+                formatting_entities=original_entity_objs
+            )
+
+            # Mark as restored in history
+            now = str(datetime.now())
+            entry['restored'] = True
+            entry['restore_date'] = now
+            entry['can_restore'] = False  # Already restored
+
+            # Update local database
+            msg['raw_text'] = original_raw_text
+            msg['text'] = entry.get('telegram_text', '')
+            msg['entities'] = original_entities
+            msg['last_update'] = now
+            msg['restored_from_backup'] = True
+
+        else:
+            # Local-only restore
+            now = str(datetime.now())
+            entry['restored'] = True
+            entry['restore_date'] = now
+            entry['restored_locally_only'] = True
+
+            msg['raw_text'] = original_raw_text
+            msg['text'] = entry.get('telegram_text', '')
+            msg['entities'] = original_entities
+            msg['last_update'] = now
+
+        return 'restored'
+
+    except FloodWaitError as e:
+        print(f"  Error: Telegram asks to wait {e.seconds} seconds before restoring message #{msg_id}.")
+        return 'error'
+    except MessageNotModifiedError:
+        print(f"  Message #{msg_id} content unchanged.")
+        return 'skipped'
+    except MessageAuthorRequiredError:
+        print(f"  Error: No permission to edit message #{msg_id}.")
+        return 'error'
+    except Exception as e:
+        print(f"  Error restoring message #{msg_id}: {e}")
+        return 'error'
 
 
 def list_edited_messages(db):
@@ -870,40 +1377,42 @@ def list_edited_messages(db):
 
     messages = db['messages'][channel_id]
 
-    # Find messages with edit history
-    edited = []
-    for msg_id, msg in messages.items():
-        if 'edit_history' in msg and msg['edit_history']:
-            edited.append((msg_id, msg))
-
-    if not edited:
-        print("\nNo edited messages found!")
-        return
-
-    # Sort by message ID
-    edited.sort(key=lambda x: int(x[0]))
-
-    print("\n" + "=" * 70)
-    print("                    EDITED MESSAGES")
-    print("=" * 70)
-    print(f"\nActive channel: {active['title']}")
-    print(f"Total edited messages: {len(edited)}")
-    print("\n" + "-" * 70)
-    print(f"{'ID':<10} | {'Edits':<6} | {'Restorable':<10} | {'Last Edit':<20}")
-    print("-" * 70)
-
-    for msg_id, msg in edited:
-        history = msg['edit_history']
+    # Format the rows while finding the edited messages, in message ID order
+    rows = []
+    total_edits = 0
+    for msg_id in _edited_message_ids(channel_id, messages):
+        history = messages[msg_id].get('edit_history')
+        if not history:
+            continue
         num_edits = len(history)
+        total_edits += num_edits
 
         # Count restorable edits
         restorable = sum(1 for e in history if e.get('can_restore') and e.get('telegram_raw_text'))
         restorable_str = f"Yes ({restorable})" if restorable > 0 else "No"
 
         # Get last edit date
-        last_edit = history[-1].get('date', 'Unknown')[:19] if history else 'Unknown'
+        last_edit = history[-1].get('date', 'Unknown')[:19]
 
-        print(f"{msg_id:<10} | {num_edits:<6} | {restorable_str:<10} | {last_edit:<20}")
+        rows.append(f"{msg_id:<10} | {num_edits:<6} | {restorable_str:<10} | {last_edit:<20}")
 
-    print("-" * 70)
-    print(f"\nTotal: {len(edited)} messages with {sum(len(m['edit_history']) for _, m in edited)} total edits")
+    if not rows:
+        print("\nNo edited messages found!")
+        return
+
+    lines = [
+        "\n" + "=" * 70,
+        "                    EDITED MESSAGES",
+        "=" * 70,
+        f"\nActive channel: {active['title']}",
+        f"Total edited messages: {len(rows)}",
+        "\n" + "-" * 70,
+        f"{'ID':<10} | {'Edits':<6} | {'Restorable':<10} | {'Last Edit':<20}",
+        "-" * 70,
+    ]
+    lines += rows
+    lines.append("-" * 70)
+    lines.append(f"\nTotal: {len(rows)} messages with {total_edits} total edits")
+
+    # One write for the whole table instead of a print per row
+    sys.stdout.write("\n".join(lines) + "\n")
@@ -3,10 +3,11 @@ Users management module.
 Handles operations related to Telegram channel users.
 """
 import logging
+import asyncio
 from datetime import datetime
 
 from src.channels import get_active_channel
-from src.database import save_database
+from src.database import save_channel_items
 
 logger = logging.getLogger(__name__)
 
@@ -47,6 +48,8 @@ async def save_channel_users(client, db, db_path):
         
         print(f"\nProcessing {total} users...")
         
+        # Only the users seen now are written, not the whole database
+        changed = {}
         for user in participants:
             user_dict = {
                 'id': user.id,
@@ -74,12 +77,14 @@ async def save_channel_users(client, db, db_path):
                 user_dict['first_seen'] = str(datetime.now())
                 db['users'][channel_id][user_id] = user_dict
                 saved += 1
+            changed[user_id] = db['users'][channel_id][user_id]
             
             # Show progress every 10 users
             if (saved + updated) % 10 == 0:
                 print(f"Progress: {saved + updated}/{total}")
         
-        save_database(db_path, db)
+        if changed:
+            await asyncio.to_thread(save_channel_items, db_path, 'users', channel_id, changed)
         print(f"\nOperation completed!")
         print(f"New users saved: {saved}")
         print(f"Users updated: {updated}")